@@ -1,47 +1,159 @@
+import asyncio
+import hashlib
 import os
 import json
-from typing import Dict, Any
-import google.generativeai as genai
+import threading
+from typing import Dict, Any, Optional
+from app.ai.analysis_cache import analysis_cache, cache_key
+from app.ai.circuit_breaker import CircuitBreaker
+from app.ai.keyword_matcher import keyword_matcher
+from app.ai.stub_model import StubModel
+from app.services.targeting import USER_LIST_KEYS
+
+AI_RISK_MODEL = os.getenv("AI_RISK_MODEL", "gemini-2.5-flash")  # "stub" for offline runs
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "20"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_CIRCUIT_FAILURES = int(os.getenv("AI_CIRCUIT_FAILURES", "5"))
+AI_CIRCUIT_RESET_SECONDS = float(os.getenv("AI_CIRCUIT_RESET_SECONDS", "30"))
+
+PROMPT_USER_LIST_LIMIT = 20
+
+def prompt_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flag config for the prompt, with long targeting user lists replaced by their size
+    """
+    return {
+        key: f"<{len(value)} user IDs>"
+        if key in USER_LIST_KEYS and isinstance(value, list) and len(value) > PROMPT_USER_LIST_LIMIT else value
+        for key, value in (config or {}).items()
+    }
 
 class AIRiskAnalyzer:
-    def __init__(self):
+    """
+    Holds one model client for the process; use get_risk_analyzer() rather than constructing it per request.
+    Provider calls have a deadline, a cap on in-flight requests, and a circuit breaker that
+    goes straight to _fallback_analysis while the provider keeps failing.
+    Model results are cached by a hash of the prompt inputs, model and PROMPT_VERSION.
+    """
+
+    def __init__(self, model_name: str = AI_RISK_MODEL):
+        self.model_name = model_name
+        self.cache = analysis_cache
+        self.timeout = AI_TIMEOUT_SECONDS
+        self.breaker = CircuitBreaker(AI_CIRCUIT_FAILURES, AI_CIRCUIT_RESET_SECONDS)
+        self._semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+        self._thread_semaphore = threading.BoundedSemaphore(AI_MAX_CONCURRENCY)
+
         api_key = os.getenv("GOOGLE_API_KEY")
 
-        if not api_key or api_key.startswith("fake-"):
+        if model_name == "stub":
+            print("Using stub risk model")
+            self.model = StubModel()
+        elif not api_key or api_key.startswith("fake-"):
             print("⚠️ No valid API key, will use fallback analysis")
             self.model = None
         else:
             try:
+                # Imported here: the SDK takes about a second to import and only a real model needs it
+                import google.generativeai as genai
                 genai.configure(api_key=api_key)
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
+                self.model = genai.GenerativeModel(model_name)
                 print("Google Gemini initialized successfully")
             except Exception as e:
                 print(f"Failed to initialize Gemini: {e}")
                 self.model = None
 
+    async def analyze_feature_flag_async(self, flag_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Analyze without blocking the event loop; falls back when the model is unavailable, slow or failing
+        """
+        if not self.model:
+            return self._fallback_analysis(flag_data)
+
+        key = cache_key(flag_data, self.model_name, PROMPT_VERSION)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            print(f"AI Analysis cache hit: {cached['risk_level']} risk, score {cached['risk_score']}")
+            return cached
+
+        if not self.breaker.allow():
+            return self._fallback_analysis(flag_data)
+
+        prompt = self._build_prompt(flag_data)
+
+        # Waiting for a free slot is outside the deadline and never counts against the breaker:
+        # a queue under load is not a provider failure
+        async with self._semaphore:
+            if not self.breaker.allow():
+                return self._fallback_analysis(flag_data)
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(prompt, request_options={"timeout": self.timeout}),
+                    timeout=self.timeout
+                )
+            except asyncio.CancelledError:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                print(f"AI Analysis failed: {type(e).__name__} {str(e)} (circuit {self.breaker.state})")
+                return self._fallback_analysis(flag_data)
+
+        self.breaker.record_success()
+        result = self._parse_or_none(response)
+        if result is None:
+            return self._fallback_analysis(flag_data)
+
+        await self.cache.put(key, result, self.model_name, PROMPT_VERSION)
+        return result
+
     def analyze_feature_flag(self, flag_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Using Google Gemini to analyze feature flag risk
+        Using Google Gemini to analyze feature flag risk (blocking; prefer analyze_feature_flag_async)
+        Only the in-memory cache tier is used here
         """
         if not self.model:
-            print("Using fallback analysis")
             return self._fallback_analysis(flag_data)
 
-        try:
-            prompt = self._build_prompt(flag_data)
+        key = cache_key(flag_data, self.model_name, PROMPT_VERSION)
+        cached = self.cache.get_local(key)
+        if cached is not None:
+            return cached
 
-            response = self.model.generate_content(prompt)
+        if not self.breaker.allow():
+            return self._fallback_analysis(flag_data)
 
-            result = self._parse_response(response.text)
+        prompt = self._build_prompt(flag_data)
 
-            print(f"AI Analysis successful: {result['risk_level']} risk, score {result['risk_score']}")
-            return result
+        try:
+            with self._thread_semaphore:
+                response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"AI Analysis failed: {type(e).__name__} {str(e)} (circuit {self.breaker.state})")
+            return self._fallback_analysis(flag_data)
 
+        self.breaker.record_success()
+        result = self._parse_or_none(response)
+        if result is None:
+            return self._fallback_analysis(flag_data)
+
+        self.cache.put_local(key, result)
+        return result
+
+    def _parse_or_none(self, response) -> Optional[Dict[str, Any]]:
+        # A malformed answer is not a provider outage, so it does not count against the breaker
+        try:
+            result = self._parse_response(response.text)
         except Exception as e:
             print(f"AI Analysis failed: {str(e)}")
-            return self._fallback_analysis(flag_data)
+            return None
+
+        print(f"AI Analysis successful: {result['risk_level']} risk, score {result['risk_score']}")
+        return result
 
-    def _build_prompt(self, flag_data: Dict[str, Any]) -> str:
+    @staticmethod
+    def _build_prompt(flag_data: Dict[str, Any]) -> str:
         """
         Create Prompts
         """
@@ -54,7 +166,7 @@ Analyze this feature flag submission for potential risks:
 - Description: {flag_data.get('description', '')}
 - Scope: {flag_data.get('scope', '')} (frontend/backend/database/all systems)
 - Code Changes: {flag_data.get('code_changes', '')}
-- Configuration: {json.dumps(flag_data.get('config', {}))}
+- Configuration: {json.dumps(prompt_config(flag_data.get('config', {})))}
 
 **Your Task:**
 Assess the risk level and provide detailed analysis.
@@ -131,98 +243,23 @@ Now analyze the feature flag above:"""
             raise
 
     def _fallback_analysis(self, flag_data: Dict[str, Any]) -> Dict[str, Any]:
-        scope = flag_data.get("scope", "").lower()
-        code_changes = flag_data.get("code_changes", "").lower()
-        description = flag_data.get("description", "").lower()
-        name = flag_data.get("name", "").lower()
-
-        all_text = f"{name} {scope} {code_changes} {description}"
-
-        print(f"\nFallback Analysis: {name}")
-        print(f"Scope: {scope}")
-
-        critical_keywords = {
-            "payment": 35, "billing": 35, "delete user": 40, "delete data": 35,
-            "drop table": 45, "production data": 40, "user password": 35, "credit card": 40,
-        }
-
-        high_risk_keywords = {
-            "authentication": 25, "security": 25, "database schema": 25, "migration": 25,
-            "alter table": 28, "oauth": 20, "redis": 12, "cache": 10,
-        }
-
-        medium_risk_keywords = {
-            "database": 15, "sql": 15, "backend api": 12, "third-party service": 12,
-            "external api": 12, "webhook": 10, "ml model": 15, "tensorflow": 12, "algorithm": 12,
-        }
-
-        routine_keywords = {
-            "api": 5, "backend": 4, "integration": 8, "email": 6, "notification": 5,
-            "template": 3, "user": 3, "data": 3, "retry": 4, "queue": 6, "async": 5,
-        }
-
-        detected_issues = []
-        risk_score = 10
-
-        critical_found = high_found = medium_found = routine_found = 0
-
-        for keyword, weight in critical_keywords.items():
-            if keyword in all_text:
-                detected_issues.append(f"critical_{keyword.replace(' ', '_')}")
-                risk_score += weight
-                critical_found += 1
-                print(f"  CRITICAL: '{keyword}' → +{weight}")
-
-        for keyword, weight in high_risk_keywords.items():
-            if keyword in all_text:
-                detected_issues.append(f"high_{keyword.replace(' ', '_')}")
-                risk_score += weight
-                high_found += 1
-                print(f"  HIGH: '{keyword}' → +{weight}")
-
-        for keyword, weight in medium_risk_keywords.items():
-            if keyword in all_text:
-                detected_issues.append(f"medium_{keyword.replace(' ', '_')}")
-                risk_score += weight
-                medium_found += 1
-                print(f"  MEDIUM: '{keyword}' → +{weight}")
-
-        for keyword, weight in routine_keywords.items():
-            if keyword in all_text:
-                detected_issues.append(f"routine_{keyword.replace(' ', '_')}")
-                risk_score += weight
-                routine_found += 1
-
-        if scope in ["all", "all systems"]:
-            risk_score += 15
-            detected_issues.append("affects_all_systems")
-        elif scope == "database":
-            risk_score += 20
-            detected_issues.append("database_scope")
-
-        risk_score = min(risk_score, 100)
-
-        print(f"  Final Score: {risk_score}/100")
-
-        if risk_score >= 75:
-            risk_level = "critical"
-            recommendation = "Requires CTO approval and full security review"
-        elif risk_score >= 60:
-            risk_level = "high"
-            recommendation = "Requires engineering manager and senior engineer approval"
-        elif risk_score >= 30:
-            risk_level = "medium"
-            recommendation = "Requires senior engineer approval"
-        else:
-            risk_level = "low"
-            recommendation = "Can be approved by team lead"
-
-        print(f"  Risk Level: {risk_level.upper()}\n")
-
-        return {
-            "risk_level": risk_level,
-            "risk_score": risk_score,
-            "detected_issues": detected_issues if detected_issues else ["routine_change"],
-            "ai_reasoning": f"Fallback analysis: {critical_found} critical, {high_found} high, {medium_found} medium, {routine_found} routine keywords detected.",
-            "recommendation": recommendation
-        }
+        result = keyword_matcher.score(flag_data)
+        print(f"Fallback analysis: {flag_data.get('name', '')} → {result['risk_level']} ({result['risk_score']}/100)")
+        return result
+
+# Fingerprint of the prompt template; editing the template changes every cache key
+PROMPT_VERSION = hashlib.sha256(AIRiskAnalyzer._build_prompt({}).encode()).hexdigest()[:16]
+
+_analyzer: Optional[AIRiskAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+def get_risk_analyzer() -> AIRiskAnalyzer:
+    """
+    Process-wide analyzer, created on first use
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = AIRiskAnalyzer()
+    return _analyzer
@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import delete, or_, select
+from app.db.database import AsyncSessionLocal
+from app.models.risk_analysis_cache import RiskAnalysisCache
+
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "1024"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "true").lower() == "true"
+
+# The fields _build_prompt reads; anything else in flag_data does not change the prompt
+PROMPT_FIELDS = ("name", "description", "scope", "code_changes", "config")
+
+def cache_key(flag_data: Dict[str, Any], model: str, prompt_version: str) -> str:
+    """
+    Content hash of the prompt inputs, so identical resubmissions share one entry
+    """
+    canonical = json.dumps(
+        {
+            "inputs": {field: flag_data.get(field) for field in PROMPT_FIELDS},
+            "model": model,
+            "prompt_version": prompt_version
+        },
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache of model risk analyses: an in-process LRU in front of the risk_analysis_cache table.
+    Entries expire after the TTL; the prompt version is part of every key, so a template change
+    never serves old results, and purge_stale() removes them from the table.
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL_SECONDS,
+                 persist: bool = AI_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(result)
+
+    def put_local(self, key: str, result: Dict[str, Any], expires_at: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (expires_at or time.time() + self.ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.get_local(key)
+
+        if result is None and self.persist:
+            try:
+                async with AsyncSessionLocal() as db:
+                    row = await db.scalar(
+                        select(RiskAnalysisCache)
+                        .where(RiskAnalysisCache.cache_key == key, RiskAnalysisCache.expires_at > datetime.utcnow())
+                    )
+                if row:
+                    result = row.result
+                    self.put_local(key, result, expires_at=row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+            except Exception as e:
+                print(f"Analysis cache lookup failed: {str(e)}")
+
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def put(self, key: str, result: Dict[str, Any], model: str, prompt_version: str):
+        self.put_local(key, result)
+
+        if not self.persist:
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(RiskAnalysisCache(
+                    cache_key=key,
+                    model=model,
+                    prompt_version=prompt_version,
+                    result=result,
+                    created_at=datetime.utcnow(),
+                    expires_at=datetime.utcnow() + timedelta(seconds=self.ttl)
+                ))
+                await db.commit()
+        except Exception as e:
+            print(f"Analysis cache write failed: {str(e)}")
+
+    def invalidate(self):
+        """
+        Drop the in-memory tier
+        """
+        with self._lock:
+            self._entries.clear()
+
+    async def purge_stale(self, prompt_version: str) -> int:
+        """
+        Delete expired rows and rows written for another prompt version
+        """
+        self.invalidate()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(RiskAnalysisCache).where(or_(
+                    RiskAnalysisCache.prompt_version != prompt_version,
+                    RiskAnalysisCache.expires_at <= datetime.utcnow()
+                ))
+            )
+            await db.commit()
+        return result.rowcount or 0
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,142 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Tier order is also the order detected issues are reported in
+TIERS = ("critical", "high", "medium", "routine")
+
+DEFAULT_KEYWORD_TABLES: Dict[str, Dict[str, int]] = {
+    "critical": {
+        "payment": 35, "billing": 35, "delete user": 40, "delete data": 35,
+        "drop table": 45, "production data": 40, "user password": 35, "credit card": 40,
+    },
+    "high": {
+        "authentication": 25, "security": 25, "database schema": 25, "migration": 25,
+        "alter table": 28, "oauth": 20, "redis": 12, "cache": 10,
+    },
+    "medium": {
+        "database": 15, "sql": 15, "backend api": 12, "third-party service": 12,
+        "external api": 12, "webhook": 10, "ml model": 15, "tensorflow": 12, "algorithm": 12,
+    },
+    "routine": {
+        "api": 5, "backend": 4, "integration": 8, "email": 6, "notification": 5,
+        "template": 3, "user": 3, "data": 3, "retry": 4, "queue": 6, "async": 5,
+    },
+}
+
+# Every keyword-fallback analysis starts its reasoning with this, which tells it apart from model output
+FALLBACK_REASONING_PREFIX = "Fallback analysis:"
+
+# JSON file with the same shape as DEFAULT_KEYWORD_TABLES
+RISK_KEYWORDS_FILE = os.getenv("RISK_KEYWORDS_FILE")
+
+@dataclass(frozen=True)
+class KeywordRule:
+    keyword: str
+    tier: str
+    weight: int
+    issue: str  # e.g. "critical_drop_table"
+
+class KeywordMatcher:
+    """
+    Keyword tables compiled once for the fallback risk score.
+    Each keyword is still found with str's C substring search (a regex alternation is several times
+    slower on large diffs), but a keyword is only searched for when every keyword it contains
+    was found, so absent short keywords rule out their longer variants without scanning.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, int]] = DEFAULT_KEYWORD_TABLES):
+        unknown = set(tables) - set(TIERS)
+        if unknown:
+            raise ValueError(f"Unknown keyword tiers: {', '.join(sorted(unknown))}")
+
+        self.rules: Tuple[KeywordRule, ...] = tuple(
+            KeywordRule(keyword.lower(), tier, weight, f"{tier}_{keyword.lower().replace(' ', '_')}")
+            for tier in TIERS
+            for keyword, weight in tables.get(tier, {}).items()
+        )
+
+        # Shortest first, so contained keywords are decided before the keywords containing them
+        keywords = list(dict.fromkeys(rule.keyword for rule in self.rules))
+        self._scan_order: Tuple[Tuple[str, FrozenSet[str]], ...] = tuple(
+            (keyword, frozenset(other for other in keywords if other != keyword and other in keyword))
+            for keyword in sorted(keywords, key=len)
+        )
+
+    def find(self, text: str) -> List[KeywordRule]:
+        """
+        Rules whose keyword occurs in the (already lowercased) text, in table order
+        """
+        found = set()
+        for keyword, contained in self._scan_order:
+            if (not contained or found.issuperset(contained)) and keyword in text:
+                found.add(keyword)
+        return [rule for rule in self.rules if rule.keyword in found]
+
+    def score(self, flag_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Keyword-based risk analysis in the same shape as the AI result
+        """
+        scope = (flag_data.get("scope") or "").lower()
+        code_changes = (flag_data.get("code_changes") or "").lower()
+        description = (flag_data.get("description") or "").lower()
+        name = (flag_data.get("name") or "").lower()
+
+        all_text = f"{name} {scope} {code_changes} {description}"
+
+        detected_issues = []
+        risk_score = 10
+        found_per_tier = dict.fromkeys(TIERS, 0)
+
+        for rule in self.find(all_text):
+            detected_issues.append(rule.issue)
+            risk_score += rule.weight
+            found_per_tier[rule.tier] += 1
+
+        if scope in ["all", "all systems"]:
+            risk_score += 15
+            detected_issues.append("affects_all_systems")
+        elif scope == "database":
+            risk_score += 20
+            detected_issues.append("database_scope")
+
+        risk_score = min(risk_score, 100)
+
+        if risk_score >= 75:
+            risk_level = "critical"
+            recommendation = "Requires CTO approval and full security review"
+        elif risk_score >= 60:
+            risk_level = "high"
+            recommendation = "Requires engineering manager and senior engineer approval"
+        elif risk_score >= 30:
+            risk_level = "medium"
+            recommendation = "Requires senior engineer approval"
+        else:
+            risk_level = "low"
+            recommendation = "Can be approved by team lead"
+
+        return {
+            "risk_level": risk_level,
+            "risk_score": risk_score,
+            "detected_issues": detected_issues if detected_issues else ["routine_change"],
+            "ai_reasoning": (
+                f"{FALLBACK_REASONING_PREFIX} {found_per_tier['critical']} critical, {found_per_tier['high']} high, "
+                f"{found_per_tier['medium']} medium, {found_per_tier['routine']} routine keywords detected."
+            ),
+            "recommendation": recommendation
+        }
+
+    def score_many(self, submissions: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Score many submissions with the compiled tables, in input order
+        """
+        return [self.score(flag_data) for flag_data in submissions]
+
+def load_keyword_tables(path: Optional[str] = RISK_KEYWORDS_FILE) -> Dict[str, Dict[str, int]]:
+    if not path:
+        return DEFAULT_KEYWORD_TABLES
+    with open(path) as f:
+        return json.load(f)
+
+keyword_matcher = KeywordMatcher(load_keyword_tables())
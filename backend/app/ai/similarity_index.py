@@ -0,0 +1,328 @@
+import asyncio
+import os
+import re
+import threading
+import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import AsyncSessionLocal
+from app.ai.keyword_matcher import FALLBACK_REASONING_PREFIX
+from app.models.feature_flag import AnalysisStatus, FeatureFlag
+from app.models.risk_analysis import RiskAnalysis
+
+# Estimated Jaccard similarity of two submissions' word shingles needed to reuse an analysis
+AI_REUSE_SIMILARITY = float(os.getenv("AI_REUSE_SIMILARITY", "0.8"))
+# Persist the reused analysis instead of calling the model (otherwise it is only a provisional answer)
+AI_REUSE_SKIP_MODEL = os.getenv("AI_REUSE_SKIP_MODEL", "false").lower() == "true"
+# How often each worker loads analyses made since its last load (including those by other processes)
+AI_REUSE_REFRESH_SECONDS = float(os.getenv("AI_REUSE_REFRESH_SECONDS", "30"))
+# Each refresh looks back this much further, for analyses committed after a later one was already loaded
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+UNSORTED_ROWS = 1024  # Recently added rows searched by brute force before the bands are re-sorted
+MAX_CODE_CHARS = 20000  # Diffs are indexed by their head; enough to tell variants apart
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_rng = np.random.default_rng(20261017)
+_PERM_A = _rng.integers(1, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_BAND_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+def shingles(flag_data: Dict[str, Any]) -> set:
+    """
+    Word unigrams and bigrams of the fields the risk prompt is built from
+    """
+    text = " ".join([
+        flag_data.get("name") or "",
+        flag_data.get("description") or "",
+        flag_data.get("scope") or "",
+        (flag_data.get("code_changes") or "")[:MAX_CODE_CHARS]
+    ]).lower()
+    tokens = TOKEN_RE.findall(text)
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+def minhash(features: set) -> Optional[np.ndarray]:
+    """
+    MinHash signature (NUM_PERMUTATIONS uint32 values) using multiply-shift hashing
+    """
+    if not features:
+        return None
+    hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint64, count=len(features))
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """
+    One uint64 key per LSH band, shape (n, BANDS)
+    """
+    rows = signatures.reshape(-1, BANDS, ROWS_PER_BAND).astype(np.uint64)
+    keys = np.zeros(rows.shape[:2], dtype=np.uint64)
+    for r in range(ROWS_PER_BAND):
+        keys = (keys * _BAND_MIX) ^ rows[:, :, r]
+    return keys
+
+@dataclass(frozen=True)
+class SimilarFlag:
+    flag_id: str
+    similarity: float
+
+class SimilarityIndex:
+    """
+    MinHash LSH index over past submissions that have a model-made risk analysis.
+    Each band keeps its keys in a sorted array, so a lookup is BANDS binary searches plus an exact
+    signature comparison on the few candidates (and on up to UNSORTED_ROWS recent additions),
+    independent of how many flags are stored.
+    The index lives in this process; it is rebuilt from the database on startup, extended as analyses finish here,
+    and refreshed every AI_REUSE_REFRESH_SECONDS with analyses made since (by any process).
+    """
+
+    # Replaced together when the index is reloaded
+    _STATE = ("_signatures", "_flag_ids", "_positions", "_band_keys", "_band_rows", "_indexed_rows")
+
+    def __init__(self, threshold: float = AI_REUSE_SIMILARITY):
+        self.threshold = threshold
+        self._lock = threading.Lock()  # load() runs in a thread; add() and query() on the event loop
+        self._recording: Optional[List[tuple]] = None  # Adds made while a reload is in progress
+        self._loaded_until: Optional[datetime] = None  # Newest analysis read from the database
+        self._clear()
+
+    def _clear(self):
+        self._signatures = np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        self._flag_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._band_keys = [np.zeros(0, dtype=np.uint64) for _ in range(BANDS)]
+        self._band_rows = [np.zeros(0, dtype=np.int64) for _ in range(BANDS)]
+        self._indexed_rows = 0  # Rows before this are in the band arrays
+
+    def __len__(self) -> int:
+        return len(self._flag_ids)
+
+    def add(self, flag_id, flag_data: Dict[str, Any]):
+        self.add_many([(flag_id, flag_data)])
+
+    def add_many(self, entries: List[tuple]):
+        """
+        Add (flag_id, flag_data) entries; flags already indexed are skipped
+        """
+        signatures = [(str(flag_id), minhash(shingles(flag_data))) for flag_id, flag_data in entries]
+        with self._lock:
+            for flag_id, signature in signatures:
+                if signature is None:
+                    continue
+                if self._recording is not None:
+                    self._recording.append((flag_id, signature))
+                self._append(flag_id, signature)
+
+    def start_recording(self):
+        """
+        Keep adds from now on for the next load(), which replays them onto the loaded index
+        """
+        with self._lock:
+            if self._recording is None:
+                self._recording = []
+
+    def _append(self, flag_id: str, signature: np.ndarray):
+        if flag_id in self._positions:
+            return
+
+        row = len(self._flag_ids)
+        if row == len(self._signatures):
+            # Grow by doubling so appends stay amortized O(1)
+            grown = np.zeros((max(64, row * 2), NUM_PERMUTATIONS), dtype=np.uint32)
+            grown[:row] = self._signatures[:row]
+            self._signatures = grown
+        self._signatures[row] = signature
+        self._flag_ids.append(flag_id)
+        self._positions[flag_id] = row
+
+        # New rows are compared directly until there are enough to be worth re-sorting the bands
+        if row - self._indexed_rows >= UNSORTED_ROWS:
+            self._index_bands()
+
+    def _index_bands(self):
+        count = len(self._flag_ids)
+        keys = band_keys(self._signatures[:count])
+        for band in range(BANDS):
+            order = np.argsort(keys[:, band], kind="stable")
+            self._band_keys[band] = keys[order, band]
+            self._band_rows[band] = order
+        self._indexed_rows = count
+
+    def load(self, entries: List[tuple]):
+        """
+        Replace the index with (flag_id, flag_data) entries.
+        Everything is built aside and swapped in at the end, so this can run in a thread while queries continue;
+        adds made since start_recording() (or since this call began) are replayed onto the new index.
+        """
+        self.start_recording()
+        signatures, flag_ids, positions = [], [], {}
+        for flag_id, flag_data in entries:
+            signature = minhash(shingles(flag_data))
+            if signature is not None and str(flag_id) not in positions:
+                positions[str(flag_id)] = len(flag_ids)
+                flag_ids.append(str(flag_id))
+                signatures.append(signature)
+
+        loaded = SimilarityIndex(self.threshold)
+        if signatures:
+            loaded._signatures = np.vstack(signatures)
+            loaded._flag_ids = flag_ids
+            loaded._positions = positions
+            loaded._index_bands()
+
+        with self._lock:
+            recorded, self._recording = self._recording or [], None
+            for name in self._STATE:
+                setattr(self, name, getattr(loaded, name))
+            for flag_id, signature in recorded:
+                self._append(flag_id, signature)
+
+    def query(self, flag_data: Dict[str, Any]) -> Optional[SimilarFlag]:
+        """
+        Most similar indexed flag at or above the threshold, or None
+        """
+        signature = minhash(shingles(flag_data))
+        if signature is None:
+            return None
+        with self._lock:
+            return self._query(signature)
+
+    def _query(self, signature: np.ndarray) -> Optional[SimilarFlag]:
+        if not self._flag_ids:
+            return None
+
+        candidates = []
+        for band, key in enumerate(band_keys(signature[None, :])[0]):
+            keys = self._band_keys[band]
+            lo = np.searchsorted(keys, key, side="left")
+            hi = np.searchsorted(keys, key, side="right")
+            if hi > lo:
+                candidates.append(self._band_rows[band][lo:hi])
+        candidates.append(np.arange(self._indexed_rows, len(self._flag_ids)))
+
+        rows = np.unique(np.concatenate(candidates))
+        if not len(rows):
+            return None
+        similarities = (self._signatures[rows] == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return SimilarFlag(self._flag_ids[rows[best]], float(similarities[best]))
+
+    async def _read(self, since: Optional[datetime] = None) -> List[tuple]:
+        """
+        (flag_id, flag_data, analyzed_at) of flags whose analysis came from the model (not the keyword fallback),
+        only for analyses made after since if given
+        """
+        model_analysis = [
+            RiskAnalysis.flag_id == FeatureFlag.id,
+            ~RiskAnalysis.ai_reasoning.startswith(FALLBACK_REASONING_PREFIX)
+        ]
+        if since is None:
+            analyzed_at = select(func.max(RiskAnalysis.analyzed_at)).where(*model_analysis).scalar_subquery()
+            condition = exists().where(*model_analysis)
+        else:
+            analyzed_at = RiskAnalysis.analyzed_at
+            condition = and_(*model_analysis, RiskAnalysis.analyzed_at > since)
+        query = (
+            select(
+                FeatureFlag.id, FeatureFlag.name, FeatureFlag.description, FeatureFlag.scope,
+                func.substr(FeatureFlag.code_changes, 1, MAX_CODE_CHARS), analyzed_at
+            )
+            .where(FeatureFlag.analysis_status == AnalysisStatus.COMPLETED, condition)
+            .execution_options(yield_per=1000)
+        )
+
+        entries = []
+        async with AsyncSessionLocal() as db:
+            async for flag_id, name, description, scope, code_changes, analyzed in await db.stream(query):
+                entries.append((flag_id, {
+                    "name": name, "description": description, "scope": scope, "code_changes": code_changes
+                }, analyzed))
+        return entries
+
+    def _advance(self, entries: List[tuple]):
+        newest = max((analyzed for _, _, analyzed in entries if analyzed), default=None)
+        if newest and (self._loaded_until is None or newest > self._loaded_until):
+            self._loaded_until = newest
+
+    async def rebuild(self):
+        """
+        Index every flag whose analysis came from the model
+        """
+        # Analyses that finish after the query below reads the table are added while it runs; keep them
+        self.start_recording()
+        try:
+            entries = await self._read()
+        except Exception as e:
+            with self._lock:
+                self._recording = None
+            print(f"Similarity index load failed: {str(e)}")
+            return
+
+        await asyncio.to_thread(self.load, [(flag_id, flag_data) for flag_id, flag_data, _ in entries])
+        self._advance(entries)
+        if self._loaded_until is None:
+            self._loaded_until = datetime.utcnow() - REFRESH_OVERLAP  # Nothing analyzed yet
+        print(f"Similarity index loaded {len(self)} analyzed flags")
+
+    async def refresh(self):
+        """
+        Add flags analyzed since the last load, by this process or any other; a full rebuild if none succeeded yet
+        """
+        if self._loaded_until is None:
+            await self.rebuild()
+            return
+        entries = await self._read(self._loaded_until - REFRESH_OVERLAP)
+        if entries:
+            await asyncio.to_thread(self.add_many, [(flag_id, flag_data) for flag_id, flag_data, _ in entries])
+            self._advance(entries)
+
+    async def run(self, interval: float = AI_REUSE_REFRESH_SECONDS):
+        """
+        Build the index, then keep it up to date in the background
+        """
+        await self.rebuild()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Similarity index refresh failed: {str(e)}")
+
+similarity_index = SimilarityIndex()
+
+async def find_reusable_analysis(db: AsyncSession, flag_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Latest risk analysis of the most similar analyzed flag, marked as reused, or None
+    """
+    match = similarity_index.query(flag_data)
+    if not match:
+        return None
+
+    row = (await db.execute(
+        select(RiskAnalysis, FeatureFlag.risk_level)
+        .join(FeatureFlag, RiskAnalysis.flag_id == FeatureFlag.id)
+        .where(RiskAnalysis.flag_id == uuid.UUID(match.flag_id))
+        .order_by(RiskAnalysis.analyzed_at.desc())
+        .limit(1)
+    )).first()
+    if not row:
+        return None
+
+    analysis, risk_level = row
+    result = analysis.to_dict()
+    result["risk_level"] = risk_level.value if risk_level else None
+    result["reused"] = True
+    result["reused_from_flag_id"] = match.flag_id
+    result["similarity"] = round(match.similarity, 3)
+    return result
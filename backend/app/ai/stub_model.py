@@ -0,0 +1,43 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+STUB_LATENCY_SECONDS = float(os.getenv("AI_STUB_LATENCY_SECONDS", "0"))
+STUB_FAILURE_RATE = float(os.getenv("AI_STUB_FAILURE_RATE", "0"))
+
+STUB_RESULT = {
+    "risk_level": "low",
+    "risk_score": 20,
+    "detected_issues": ["stub_model"],
+    "ai_reasoning": "Stub model response for offline runs.",
+    "recommendation": "Can be approved by team lead"
+}
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class StubModel:
+    """
+    Offline stand-in for GenerativeModel (AI_RISK_MODEL=stub).
+    Latency and failure rate are configurable so timeouts and the circuit breaker can be exercised without Gemini.
+    """
+
+    def __init__(self, latency: float = STUB_LATENCY_SECONDS, failure_rate: float = STUB_FAILURE_RATE):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def _respond(self) -> StubResponse:
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Stub model failure")
+        return StubResponse(json.dumps(STUB_RESULT))
+
+    def generate_content(self, prompt: str, request_options=None) -> StubResponse:
+        time.sleep(self.latency)
+        return self._respond()
+
+    async def generate_content_async(self, prompt: str, request_options=None) -> StubResponse:
+        await asyncio.sleep(self.latency)
+        return self._respond()
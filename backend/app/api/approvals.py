@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from app.db.database import get_db
+import uuid
+from app.api.pagination import MAX_PAGE_SIZE, keyset_page, ndjson_rows, trim_page
+from app.db.database import get_db, get_read_db
 from app.models.approval import Approval, ApprovalStatus
 from app.models.feature_flag import FeatureFlag, FlagStatus
+from app.services.flag_snapshot import flag_snapshot
+from app.services.http_cache import LISTING_CACHE_CONTROL, conditional_response, make_etag
+from app.services.revisions import current_revision, next_revision, stamp_revision
 
 router = APIRouter()
 
 class ApprovalCreate(BaseModel):
-    flag_id: str
+    flag_id: uuid.UUID
     approver_id: str
 
 class ApprovalUpdate(BaseModel):
@@ -27,13 +35,18 @@ class ApprovalResponse(BaseModel):
     created_at: str | None
     flag_details: dict | None = None
 
+def approval_with_flag(approval: Approval) -> dict:
+    approval_dict = approval.to_dict()
+    approval_dict["flag_details"] = approval.flag.to_dict() if approval.flag else None
+    return approval_dict
+
 @router.post("/", response_model=ApprovalResponse)
-async def create_approval_request(approval: ApprovalCreate, db: Session = Depends(get_db)):
+async def create_approval_request(approval: ApprovalCreate, db: AsyncSession = Depends(get_db)):
     """
     Create an approval request for a feature flag
     """
     # Check if flag exists
-    flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
+    flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == approval.flag_id))
     if not flag:
         raise HTTPException(status_code=404, detail="Flag not found")
     
@@ -42,10 +55,10 @@ async def create_approval_request(approval: ApprovalCreate, db: Session = Depend
         raise HTTPException(status_code=400, detail="Flag is not in pending status")
     
     # Check if approval already exists
-    existing = db.query(Approval).filter(
+    existing = await db.scalar(select(Approval).where(
         Approval.flag_id == approval.flag_id,
         Approval.approver_id == approval.approver_id
-    ).first()
+    ).limit(1))
     
     if existing:
         raise HTTPException(status_code=400, detail="Approval request already exists")
@@ -58,8 +71,10 @@ async def create_approval_request(approval: ApprovalCreate, db: Session = Depend
     )
     
     db.add(new_approval)
-    db.commit()
-    db.refresh(new_approval)
+    # No flag changed, but listings that include approvals did
+    await next_revision(db)
+    await db.commit()
+    await db.refresh(new_approval)
     
     response = new_approval.to_dict()
     response["flag_details"] = flag.to_dict()
@@ -67,42 +82,54 @@ async def create_approval_request(approval: ApprovalCreate, db: Session = Depend
     return response
 
 @router.get("/", response_model=List[ApprovalResponse])
-async def get_approvals(status: str = None, approver_id: str = None, db: Session = Depends(get_db)):
+async def get_approvals(
+    response: Response,
+    status: str = None,
+    approver_id: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all approvals"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams rows for exports"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Get all approval requests, optionally filtered
+    Paginate with limit/cursor (ordered by created_at, id); the next cursor is sent as X-Next-Cursor
+    Returns 304 when nothing changed since the client's ETag
     """
-    query = db.query(Approval)
+    # Approvals joined with their flags: one query regardless of row count
+    query = select(Approval).options(joinedload(Approval.flag))
     
     if status:
-        query = query.filter(Approval.status == status)
+        query = query.where(Approval.status == status)
     
     if approver_id:
-        query = query.filter(Approval.approver_id == approver_id)
+        query = query.where(Approval.approver_id == approver_id)
     
-    approvals = query.all()
+    query = keyset_page(query, Approval, cursor, limit)
     
-    result = []
-    for approval in approvals:
-        approval_dict = approval.to_dict()
-        
-        # Get flag details
-        flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
-        approval_dict["flag_details"] = flag.to_dict() if flag else None
-        
-        result.append(approval_dict)
+    if format == "ndjson":
+        return StreamingResponse(ndjson_rows(query, approval_with_flag), media_type="application/x-ndjson")
+    
+    etag = make_etag("approvals", await current_revision(db), status or "", approver_id or "", limit or "", cursor or "")
+    not_modified = conditional_response(if_none_match, response, etag, LISTING_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    approvals = trim_page((await db.scalars(query)).all(), limit, response)
     
-    return result
+    return [approval_with_flag(approval) for approval in approvals]
 
 @router.patch("/{approval_id}")
 async def update_approval(
-    approval_id: str, 
+    approval_id: uuid.UUID,
     approval_update: ApprovalUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Approve or reject an approval request
     """
-    approval = db.query(Approval).filter(Approval.id == approval_id).first()
+    approval = await db.scalar(select(Approval).where(Approval.id == approval_id))
     
     if not approval:
         raise HTTPException(status_code=404, detail="Approval not found")
@@ -116,58 +143,63 @@ async def update_approval(
         approval.approved_at = datetime.utcnow()
         
         # Update flag status
-        flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
+        flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == approval.flag_id))
         if flag:
             flag.status = FlagStatus.APPROVED
+            await stamp_revision(db, flag)
         
     elif approval_update.status.lower() == "rejected":
         approval.status = ApprovalStatus.REJECTED
         approval.approved_at = datetime.utcnow()
         
         # Update flag status
-        flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
+        flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == approval.flag_id))
         if flag:
             flag.status = FlagStatus.REJECTED
+            await stamp_revision(db, flag)
     else:
         raise HTTPException(status_code=400, detail="Invalid status")
     
     approval.comment = approval_update.comment
     
-    db.commit()
-    db.refresh(approval)
+    await db.commit()
+    await db.refresh(approval)
+    await flag_snapshot.rebuild(db)
     
     response = approval.to_dict()
     
     # Get updated flag details
-    flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
+    flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == approval.flag_id))
     response["flag_details"] = flag.to_dict() if flag else None
     
     return response
 
 @router.get("/pending/{approver_id}", response_model=List[ApprovalResponse])
-async def get_pending_approvals_for_user(approver_id: str, db: Session = Depends(get_db)):
+async def get_pending_approvals_for_user(approver_id: str, db: AsyncSession = Depends(get_read_db)):
     """
     Get all pending approvals for a specific approver
     """
-    approvals = db.query(Approval).filter(
-        Approval.approver_id == approver_id,
-        Approval.status == ApprovalStatus.PENDING
-    ).all()
+    # Approvals with their flags (joined) and the flags' risk analyses (one IN query)
+    approvals = (await db.scalars(
+        select(Approval)
+        .where(
+            Approval.approver_id == approver_id,
+            Approval.status == ApprovalStatus.PENDING
+        )
+        .options(joinedload(Approval.flag).selectinload(FeatureFlag.risk_analyses))
+    )).all()
     
     result = []
     for approval in approvals:
         approval_dict = approval.to_dict()
         
-        # Get flag details with risk analysis
-        flag = db.query(FeatureFlag).filter(FeatureFlag.id == approval.flag_id).first()
+        # Flag details with risk analysis
+        flag = approval.flag
         if flag:
-            from app.models.risk_analysis import RiskAnalysis
-            risk = db.query(RiskAnalysis).filter(RiskAnalysis.flag_id == flag.id).first()
-            
             flag_dict = flag.to_dict()
-            flag_dict["risk_analysis"] = risk.to_dict() if risk else None
+            flag_dict["risk_analysis"] = flag.risk_analyses[0].to_dict() if flag.risk_analyses else None
             approval_dict["flag_details"] = flag_dict
         
         result.append(approval_dict)
     
-    return result
+    return result
\ No newline at end of file
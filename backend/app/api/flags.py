@@ -1,24 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from pydantic import BaseModel
-from app.db.database import get_db
-from app.models.feature_flag import FeatureFlag, FlagStatus, RiskLevel
-from app.models.risk_analysis import RiskAnalysis
-from app.models.approval import Approval, ApprovalStatus
-from app.ai.ai_risk_analyzer import AIRiskAnalyzer
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+import json
+import uuid
+from app.db.database import get_db, get_read_db
+from app.models.feature_flag import AnalysisStatus, FeatureFlag, FlagStatus
+from app.ai.similarity_index import find_reusable_analysis
+from app.api.pagination import MAX_PAGE_SIZE, keyset_page, ndjson_rows, trim_page
+from app.services.bucketing import DEFAULT_ENGINE, get_engine, normalize_rollout
+from app.services.flag_import import IMPORT_CHUNK_SIZE, existing_names, import_chunk
+from app.services.flag_snapshot import flag_snapshot
+from app.services.http_cache import LISTING_CACHE_CONTROL, conditional_response, make_etag
+from app.services.revisions import current_revision, stamp_revision
+from app.services.risk_analysis_worker import risk_analysis_workers
+from app.services.targeting import validate_targeting
 from sqlalchemy.orm.attributes import flag_modified
 
 router = APIRouter()
 
-# Approver rules
-APPROVER_MAPPING = {
-    "low": "team-lead@company.com",
-    "medium": "senior-engineer@company.com",
-    "high": "engineering-manager@company.com",
-    "critical": "cto@company.com"
-}
-
 # Pydantic models for request/response
 class FlagCreate(BaseModel):
     name: str
@@ -41,18 +44,52 @@ class FlagResponse(BaseModel):
     created_at: str | None
     risk_analysis: dict | None = None
     required_approver: str | None = None
+    analysis_status: str | None = None
+
+MAX_ANALYSIS_WAIT_SECONDS = 30
+MAX_IMPORT_ROWS = 10000
+
+def pinned_config(config: dict) -> dict:
+    """
+    Copy of a flag config with its bucketing engine pinned, so changing the default later
+    never reshuffles this flag's users; raises ValueError for an unknown engine, an invalid
+    rollout percentage or invalid targeting
+    """
+    config = dict(config)
+    config.setdefault("bucketing_engine", DEFAULT_ENGINE)
+    get_engine(config["bucketing_engine"])
+    if config.get("rollout_percentage") is not None:
+        config["rollout_percentage"] = normalize_rollout(config["rollout_percentage"])
+    validate_targeting(config)
+    return config
+
+def flag_with_details(flag: FeatureFlag) -> dict:
+    """
+    Flag dict with its first risk analysis and approver; relationships must be eager loaded
+    """
+    flag_dict = flag.to_dict()
+    flag_dict["risk_analysis"] = flag.risk_analyses[0].to_dict() if flag.risk_analyses else None
+    flag_dict["required_approver"] = flag.approvals[0].approver_id if flag.approvals else None
+    return flag_dict
+
+FLAG_DETAILS = (selectinload(FeatureFlag.risk_analyses), selectinload(FeatureFlag.approvals))
 
 @router.post("/", response_model=FlagResponse)
-async def create_flag(flag: FlagCreate, db: Session = Depends(get_db)):
+async def create_flag(flag: FlagCreate, db: AsyncSession = Depends(get_db)):
     """
-    Create a new feature flag and perform AI risk analysis
-    Automatically assigns approver based on risk level
+    Create a new feature flag and queue its AI risk analysis
+    The approver is assigned from the risk level once the analysis completes
     """
     # Check if flag name already exists
-    existing = db.query(FeatureFlag).filter(FeatureFlag.name == flag.name).first()
+    existing = await db.scalar(select(FeatureFlag).where(FeatureFlag.name == flag.name))
     if existing:
         raise HTTPException(status_code=400, detail="Flag name already exists")
 
+    try:
+        config = pinned_config(flag.config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Create feature flag
     new_flag = FeatureFlag(
         name=flag.name,
@@ -60,129 +97,203 @@ async def create_flag(flag: FlagCreate, db: Session = Depends(get_db)):
         created_by=flag.created_by,
         code_changes=flag.code_changes,
         scope=flag.scope,
-        config=flag.config,
+        config=config,
         status=FlagStatus.PENDING
     )
 
     db.add(new_flag)
-    db.commit()
-    db.refresh(new_flag)
-
-    risk_data = None
-    assigned_approver = "senior-engineer@company.com"
-
-    # Perform AI risk analysis
-    try:
-        analyzer = AIRiskAnalyzer()
-        risk_result = analyzer.analyze_feature_flag({
-            "name": flag.name,
-            "description": flag.description,
-            "scope": flag.scope,
-            "code_changes": flag.code_changes,
-            "config": flag.config
-        })
+    await stamp_revision(db, new_flag)
+    await db.commit()
+    await db.refresh(new_flag)
+    await flag_snapshot.rebuild(db)
 
-        # Save risk analysis
-        risk_analysis = RiskAnalysis(
-            flag_id=new_flag.id,
-            risk_score=risk_result["risk_score"],
-            ai_reasoning=risk_result["ai_reasoning"],
-            detected_issues=risk_result["detected_issues"],
-            recommendation=risk_result["recommendation"]
-        )
+    # Risk analysis and approver assignment finish in the background; poll GET /{flag_id}/analysis
+    risk_analysis_workers.submit(new_flag.id)
 
-        # Update flag risk level
-        risk_level = risk_result["risk_level"]
-        new_flag.risk_level = RiskLevel(risk_level)
-
-        # Assign approver based on risk level
-        assigned_approver = APPROVER_MAPPING.get(risk_level, "senior-engineer@company.com")
-
-        db.add(risk_analysis)
-        db.commit()
-        db.refresh(risk_analysis)
-
-        risk_data = risk_analysis.to_dict()
+    response = new_flag.to_dict()
+    # Provisional: the analysis of a near-identical earlier flag, if there is one, until ours completes
+    response["risk_analysis"] = await find_reusable_analysis(db, {
+        "name": flag.name,
+        "description": flag.description,
+        "scope": flag.scope,
+        "code_changes": flag.code_changes
+    })
+    response["required_approver"] = None
 
-    except Exception as e:
-        print(f"Risk analysis failed: {str(e)}")
-        assigned_approver = "senior-engineer@company.com"
+    return response
 
-    #  Create Approval Request（Using approver assigned by system）
+@router.post("/import")
+async def import_flags(
+    request: Request,
+    analyze: bool = Query(True, description="Analyze inline; false queues analysis to the background workers"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk import flags from a JSON array or NDJSON (Content-Type: application/x-ndjson)
+    Names are checked against existing flags in one query; rows are inserted in chunks, one transaction each,
+    with their risk analyses run first, a few at a time. Returns a per-row report.
+    """
+    body = await request.body()
     try:
-        approval = Approval(
-            flag_id=new_flag.id,
-            approver_id=assigned_approver,
-            status=ApprovalStatus.PENDING
-        )
-        db.add(approval)
-        db.commit()
-        print(f" Created approval request for {assigned_approver} (Risk: {new_flag.risk_level})")
-    except Exception as e:
-        print(f"Failed to create approval: {str(e)}")
-
-    response = new_flag.to_dict()
-    response["risk_analysis"] = risk_data
-    response["required_approver"] = assigned_approver
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid import body: {str(e)}")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of flags")
+    if len(items) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMPORT_ROWS} flags per import")
+
+    reports = {}
+    valid = []
+    for i, item in enumerate(items):
+        try:
+            flag = FlagCreate.model_validate(item)
+            config = pinned_config(flag.config)
+        except (ValidationError, ValueError) as e:
+            reports[i] = {"row": i, "name": item.get("name") if isinstance(item, dict) else None,
+                          "status": "error", "error": str(e)}
+            continue
+        valid.append((i, flag, config))
+
+    taken = await existing_names(db, [flag.name for _, flag, _ in valid])
+    # End the name check's read transaction; each chunk analyzes before opening its own
+    await db.commit()
+    rows = []
+    for i, flag, config in valid:
+        if flag.name in taken:
+            reports[i] = {"row": i, "name": flag.name, "status": "error", "error": "Flag name already exists"}
+            continue
+        taken.add(flag.name)  # Also rejects duplicates within the import
+        rows.append({
+            "row": i,
+            "flag_data": {
+                "name": flag.name,
+                "description": flag.description,
+                "scope": flag.scope,
+                "code_changes": flag.code_changes,
+                "config": config
+            },
+            "values": {
+                "name": flag.name,
+                "description": flag.description,
+                "created_by": flag.created_by,
+                "code_changes": flag.code_changes,
+                "scope": flag.scope,
+                "config": config
+            }
+        })
 
-    return response
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        chunk = rows[start:start + IMPORT_CHUNK_SIZE]
+        try:
+            for report in await import_chunk(db, chunk, analyze):
+                reports[report["row"]] = report
+        except Exception as e:
+            await db.rollback()
+            print(f"Flag import chunk failed: {str(e)}")
+            for row in chunk:
+                reports[row["row"]] = {"row": row["row"], "name": row["values"]["name"],
+                                       "status": "error", "error": "Insert failed, chunk rolled back"}
+
+    if rows:
+        await flag_snapshot.rebuild(db)
+
+    results = [reports[i] for i in sorted(reports)]
+    created = sum(1 for report in results if report["status"] == "created")
+    return {
+        "total": len(items),
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
 
 @router.get("/", response_model=List[FlagResponse])
-async def get_flags(status: str = None, db: Session = Depends(get_db)):
+async def get_flags(
+    response: Response,
+    status: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all flags"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams rows for exports"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Get all feature flags, optionally filtered by status
+    Paginate with limit/cursor (ordered by created_at, id); the next cursor is sent as X-Next-Cursor
+    Returns 304 when nothing changed since the client's ETag
     """
-    query = db.query(FeatureFlag)
+    # Flags, risk analyses and approvals in three queries, however many flags there are
+    query = select(FeatureFlag).options(*FLAG_DETAILS)
 
     if status:
-        query = query.filter(FeatureFlag.status == status)
+        query = query.where(FeatureFlag.status == status)
 
-    flags = query.all()
+    query = keyset_page(query, FeatureFlag, cursor, limit)
 
-    result = []
-    for flag in flags:
-        flag_dict = flag.to_dict()
+    if format == "ndjson":
+        return StreamingResponse(ndjson_rows(query, flag_with_details), media_type="application/x-ndjson")
 
-        # Get risk analysis
-        risk = db.query(RiskAnalysis).filter(RiskAnalysis.flag_id == flag.id).first()
-        flag_dict["risk_analysis"] = risk.to_dict() if risk else None
+    etag = make_etag("flags", await current_revision(db), status or "", limit or "", cursor or "")
+    not_modified = conditional_response(if_none_match, response, etag, LISTING_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
 
-        # Get approver
-        approval = db.query(Approval).filter(Approval.flag_id == flag.id).first()
-        flag_dict["required_approver"] = approval.approver_id if approval else None
+    flags = trim_page((await db.scalars(query)).all(), limit, response)
 
-        result.append(flag_dict)
-
-    return result
+    return [flag_with_details(flag) for flag in flags]
 
 @router.get("/{flag_id}", response_model=FlagResponse)
-async def get_flag(flag_id: str, db: Session = Depends(get_db)):
+async def get_flag(flag_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     """
     Get a specific feature flag by ID
     """
-    flag = db.query(FeatureFlag).filter(FeatureFlag.id == flag_id).first()
+    flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == flag_id).options(*FLAG_DETAILS))
 
     if not flag:
         raise HTTPException(status_code=404, detail="Flag not found")
 
-    flag_dict = flag.to_dict()
+    return flag_with_details(flag)
 
-    # Get risk analysis
-    risk = db.query(RiskAnalysis).filter(RiskAnalysis.flag_id == flag.id).first()
-    flag_dict["risk_analysis"] = risk.to_dict() if risk else None
+@router.get("/{flag_id}/analysis")
+async def get_flag_analysis(
+    flag_id: uuid.UUID,
+    wait: float = Query(0, ge=0, le=MAX_ANALYSIS_WAIT_SECONDS, description="Seconds to wait for a pending analysis"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Risk analysis status for a flag: pending, completed or failed
+    With wait > 0 the request is held until the analysis finishes (long polling)
+    """
+    query = select(FeatureFlag).where(FeatureFlag.id == flag_id).options(*FLAG_DETAILS)
+    flag = await db.scalar(query)
+
+    if not flag:
+        raise HTTPException(status_code=404, detail="Flag not found")
 
-    # Get approver
-    approval = db.query(Approval).filter(Approval.flag_id == flag.id).first()
-    flag_dict["required_approver"] = approval.approver_id if approval else None
+    if flag.analysis_status == AnalysisStatus.PENDING and wait:
+        await risk_analysis_workers.wait_for(flag_id, wait)
+        flag = await db.scalar(query.execution_options(populate_existing=True))
 
-    return flag_dict
+    details = flag_with_details(flag)
+
+    return {
+        "flag_id": details["id"],
+        "analysis_status": details["analysis_status"],
+        "risk_level": details["risk_level"],
+        "risk_analysis": details["risk_analysis"],
+        "required_approver": details["required_approver"]
+    }
 
 @router.patch("/{flag_id}/toggle")
-async def toggle_flag(flag_id: str, db: Session = Depends(get_db)):
+async def toggle_flag(flag_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     """
     Toggle flag status between ACTIVE and INACTIVE (only for approved flags)
     """
-    flag = db.query(FeatureFlag).filter(FeatureFlag.id == flag_id).first()
+    flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == flag_id))
 
     if not flag:
         raise HTTPException(status_code=404, detail="Flag not found")
@@ -195,33 +306,38 @@ async def toggle_flag(flag_id: str, db: Session = Depends(get_db)):
     else:
         flag.status = FlagStatus.ACTIVE
 
-    db.commit()
-    db.refresh(flag)
+    await stamp_revision(db, flag)
+    await db.commit()
+    await db.refresh(flag)
+    await flag_snapshot.rebuild(db)
 
     return flag.to_dict()
 
 @router.patch("/{flag_id}/rollout")
 async def update_rollout(
-    flag_id: str,
-    rollout_percentage: int,
-    db: Session = Depends(get_db)
+    flag_id: uuid.UUID,
+    rollout_percentage: float,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update rollout percentage for a flag
+    Accepts up to two decimals (basis points), e.g. 0.1 for a 0.1% canary
     """
-    flag = db.query(FeatureFlag).filter(FeatureFlag.id == flag_id).first()
+    flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == flag_id))
 
     if not flag:
         raise HTTPException(status_code=404, detail="Flag not found")
 
-    if not 0 <= rollout_percentage <= 100:
-        raise HTTPException(status_code=400, detail="Rollout percentage must be between 0 and 100")
-
-    flag.config['rollout_percentage'] = rollout_percentage
+    try:
+        flag.config['rollout_percentage'] = normalize_rollout(rollout_percentage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     flag_modified(flag, "config")
 
-    db.commit()
-    db.refresh(flag)
+    await stamp_revision(db, flag)
+    await db.commit()
+    await db.refresh(flag)
+    await flag_snapshot.rebuild(db)
 
     return flag.to_dict()
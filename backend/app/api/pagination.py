@@ -0,0 +1,59 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from app.db.database import ReadSessionLocal
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_page(query: Select, model, cursor: Optional[str], limit: Optional[int]) -> Select:
+    """
+    Order by (created_at, id) and continue after the cursor row.
+    Fetches one extra row so the caller can tell whether there is a next page.
+    """
+    query = query.order_by(model.created_at, model.id)
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) > (created_at, row_id))
+
+    if limit:
+        query = query.limit(limit + 1)
+
+    return query
+
+def trim_page(rows: List[Any], limit: Optional[int], response: Response) -> List[Any]:
+    """
+    Drop the look-ahead row and expose the next cursor as X-Next-Cursor
+    """
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+async def ndjson_rows(query: Select, serialize: Callable[[Any], dict]) -> AsyncIterator[str]:
+    """
+    Stream rows as NDJSON from a server-side cursor, STREAM_BATCH_SIZE rows at a time.
+    Uses its own session (on the read replica, like the listings) because the request's session
+    is closed before the body is sent.
+    """
+    async with ReadSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield "".join(json.dumps(serialize(row), default=str) + "\n" for row in rows)
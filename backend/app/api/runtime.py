@@ -1,89 +1,302 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Optional
-from app.db.database import get_db
-from app.models.feature_flag import FeatureFlag, FlagStatus
-import hashlib
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+import json
+from app.services.bucketing import BUCKET_SCALE, format_bucket
+from app.services.flag_events import flag_events
+from app.services.flag_snapshot import flag_snapshot
+from app.services.http_cache import RUNTIME_CACHE_CONTROL, conditional_response, make_etag
+from app.services.exposure_log import exposure_log
+from app.services.metrics import UNKNOWN_FLAG, metrics
+from app.services.targeting import reason_label
 
 router = APIRouter()
 
+MAX_BATCH_USERS = 10000
+
+class BatchEvaluationRequest(BaseModel):
+    user_ids: List[str]
+    flag_names: Optional[List[str]] = None  # Defaults to every active flag
+    contexts: Optional[Dict[str, Dict[str, Any]]] = None  # user_id -> attributes for targeting rules
+
+class BatchEvaluationResponse(BaseModel):
+    flags: List[str]
+    results: Dict[str, Dict[str, bool]]  # user_id -> flag_name -> enabled
+
+CONTEXT_DESCRIPTION = "JSON object of user attributes for targeting rules, e.g. {\"country\": \"US\"}"
+
+def parse_context(context: Optional[str]) -> Dict[str, Any]:
+    if not context:
+        return {}
+    try:
+        user_context = json.loads(context)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="context must be a JSON object")
+    if not isinstance(user_context, dict):
+        raise HTTPException(status_code=400, detail="context must be a JSON object")
+    return user_context
+
+def counted(result: dict, flag_name: str, reason: str, user_id: Optional[str] = None) -> dict:
+    """
+    Count an evaluation (reason is the metric label for result["reason"]), log the user's exposure
+    to an existing flag, and return the result
+    """
+    metrics.count_evaluation(flag_name, result["enabled"], reason)
+    if user_id and flag_name != UNKNOWN_FLAG:
+        exposure_log.record(flag_name, user_id, result["enabled"], result["rollout_percentage"])
+    return result
+
 @router.get("/check")
 async def check_feature_flag(
     flag_name: str = Query(..., description="Feature flag name"),
     user_id: Optional[str] = Query(None, description="User ID for rollout calculation"),
-    db: Session = Depends(get_db)
+    context: Optional[str] = Query(None, description=CONTEXT_DESCRIPTION)
 ):
-    flag = db.query(FeatureFlag).filter(
-        FeatureFlag.name == flag_name
-    ).first()
+    user_context = parse_context(context)
+    flag = flag_snapshot.current().get(flag_name)
 
     if not flag:
-        return {
+        return counted({
             "flag_name": flag_name,
             "enabled": False,
             "rollout_percentage": 0,
             "reason": "Flag not found"
-        }
+        }, UNKNOWN_FLAG, "not_found")
 
-    if flag.status != FlagStatus.ACTIVE:
-        return {
+    if not flag.is_active:
+        return counted({
             "flag_name": flag_name,
             "enabled": False,
-            "rollout_percentage": flag.config.get('rollout_percentage', 0),
+            "rollout_percentage": flag.rollout_percentage or 0,
             "reason": f"Flag is {flag.status.value}, not active"
-        }
+        }, flag_name, "inactive", user_id)
 
-    rollout_percentage = flag.config.get('rollout_percentage', 100)
+    rollout_percentage = 100 if flag.rollout_percentage is None else flag.rollout_percentage
+
+    # Allow/deny lists, segments and attribute rules decide before the percentage rollout
+    if flag.targeting:
+        decision = flag.targeting.evaluate(user_id, user_context)
+        if decision:
+            enabled, reason = decision
+            return counted({
+                "flag_name": flag_name,
+                "enabled": enabled,
+                "rollout_percentage": rollout_percentage,
+                "reason": reason
+            }, flag_name, reason_label(reason), user_id)
 
     if rollout_percentage == 100:
-        return {
+        return counted({
             "flag_name": flag_name,
             "enabled": True,
             "rollout_percentage": 100,
             "reason": "Full rollout (100%)"
-        }
+        }, flag_name, "full_rollout", user_id)
 
     if user_id:
-        hash_input = f"{flag_name}:{user_id}"
-        user_hash = int(hashlib.md5(hash_input.encode()).hexdigest(), 16) % 100
+        bucket = flag.bucket(user_id)
+        user_hash = format_bucket(bucket, rollout_percentage)
 
-        enabled = user_hash < rollout_percentage
+        enabled = bucket < flag.rollout_threshold
 
-        return {
+        return counted({
             "flag_name": flag_name,
             "enabled": enabled,
             "rollout_percentage": rollout_percentage,
             "reason": f"User hash: {user_hash}, rollout: {rollout_percentage}%, enabled: {enabled}"
-        }
+        }, flag_name, "rollout", user_id)
 
-    return {
+    return counted({
         "flag_name": flag_name,
         "enabled": False,
         "rollout_percentage": rollout_percentage,
         "reason": "No user_id provided for rollout calculation"
-    }
+    }, flag_name, "no_user_id")
 
 @router.get("/all")
 async def get_all_active_flags(
+    response: Response,
     user_id: Optional[str] = Query(None, description="User ID for rollout calculation"),
-    db: Session = Depends(get_db)
+    context: Optional[str] = Query(None, description=CONTEXT_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None)
 ):
-    active_flags = db.query(FeatureFlag).filter(
-        FeatureFlag.status == FlagStatus.ACTIVE
-    ).all()
+    user_context = parse_context(context)
+    snapshot = flag_snapshot.current()
+
+    etag = make_etag("all", snapshot.fingerprint, user_id or "", context or "")
+    not_modified = conditional_response(if_none_match, response, etag, RUNTIME_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
 
     result = {}
+    count_evaluation = metrics.count_evaluation
 
-    for flag in active_flags:
-        rollout_percentage = flag.config.get('rollout_percentage', 100)
+    for flag in snapshot.active:
+        if flag.targeting:
+            decision = flag.targeting.evaluate(user_id, user_context)
+            if decision:
+                result[flag.name] = decision[0]
+                count_evaluation(flag.name, decision[0], reason_label(decision[1]))
+                continue
+
+        rollout_percentage = 100 if flag.rollout_percentage is None else flag.rollout_percentage
 
         if rollout_percentage == 100:
             result[flag.name] = True
+            count_evaluation(flag.name, True, "full_rollout")
         elif user_id:
-            hash_input = f"{flag.name}:{user_id}"
-            user_hash = int(hashlib.md5(hash_input.encode()).hexdigest(), 16) % 100
-            result[flag.name] = user_hash < rollout_percentage
+            result[flag.name] = flag.bucket(user_id) < flag.rollout_threshold
+            count_evaluation(flag.name, result[flag.name], "rollout")
         else:
             result[flag.name] = False
+            count_evaluation(flag.name, False, "no_user_id")
+
+    if user_id and exposure_log.enabled:
+        for flag in snapshot.active:
+            exposure_log.record(
+                flag.name, user_id, result[flag.name],
+                100 if flag.rollout_percentage is None else flag.rollout_percentage
+            )
 
     return result
+
+@router.post("/batch", response_model=BatchEvaluationResponse)
+async def evaluate_batch(request: BatchEvaluationRequest):
+    """
+    Evaluate many flags for many users in one call
+    Unknown or inactive flags evaluate to False for every user
+    """
+    if len(request.user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_USERS} user_ids per batch")
+
+    snapshot = flag_snapshot.current()
+
+    if request.flag_names is None:
+        rules = {flag.name: flag for flag in snapshot.active}
+    else:
+        rules = {name: snapshot.get(name) for name in request.flag_names}
+
+    user_ids = list(dict.fromkeys(request.user_ids))
+    encoded_user_ids = [user_id.encode() for user_id in user_ids]
+    contexts = request.contexts or {}
+
+    # Evaluate column by column: one bucketing pass per flag over all users
+    columns = {}
+    for flag_name, flag in rules.items():
+        if not flag or not flag.is_active:
+            columns[flag_name] = [False] * len(user_ids)
+            if flag:
+                metrics.count_evaluation(flag_name, False, "inactive", len(user_ids))
+            else:
+                metrics.count_evaluation(UNKNOWN_FLAG, False, "not_found", len(user_ids))
+            continue
+
+        threshold = flag.rollout_threshold
+
+        if threshold >= BUCKET_SCALE:
+            columns[flag_name] = [True] * len(user_ids)
+        elif threshold <= 0:
+            columns[flag_name] = [False] * len(user_ids)
+        else:
+            buckets = flag.bucketing_engine.buckets(flag.bucketing_salt, encoded_user_ids)
+            columns[flag_name] = [
+                bool(user_id) and bucket < threshold
+                for user_id, bucket in zip(user_ids, buckets)
+            ]
+
+        if flag.targeting:
+            column = columns[flag_name]
+            for i, user_id in enumerate(user_ids):
+                decision = flag.targeting.evaluate(user_id, contexts.get(user_id))
+                if decision:
+                    column[i] = decision[0]
+
+        # Counted per column rather than per user, labelled "batch"
+        enabled_count = sum(columns[flag_name])
+        if enabled_count:
+            metrics.count_evaluation(flag_name, True, "batch", enabled_count)
+        if enabled_count < len(user_ids):
+            metrics.count_evaluation(flag_name, False, "batch", len(user_ids) - enabled_count)
+
+    results = {}
+    for i, user_id in enumerate(user_ids):
+        results[user_id] = {flag_name: column[i] for flag_name, column in columns.items()}
+
+    return {"flags": list(rules), "results": results}
+
+@router.get("/ruleset")
+async def get_ruleset(
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Compiled rules for every flag, for SDKs that evaluate locally
+    """
+    snapshot = flag_snapshot.current()
+
+    etag = make_etag("ruleset", snapshot.fingerprint)
+    not_modified = conditional_response(if_none_match, response, etag, RUNTIME_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+
+    # Only the segments some flag references; user lists too long to inline are bloom filters
+    referenced = {
+        segment.name
+        for rule in snapshot.flags.values() if rule.targeting
+        for segment in rule.targeting.target_segments + rule.targeting.excluded_segments
+    }
+
+    return {
+        "revision": snapshot.revision,
+        "flags": {name: rule.to_ruleset_dict() for name, rule in snapshot.flags.items()},
+        "segments": {
+            name: segment.to_ruleset_dict()
+            for name, segment in snapshot.segments.items() if name in referenced
+        }
+    }
+
+@router.get("/changes")
+async def get_flag_changes(
+    response: Response,
+    since: int = Query(0, ge=0, description="Ruleset revision the client already has"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Flags changed after a ruleset revision, including ones deactivated or moved out of active
+    Clients apply the changes and store the returned revision for the next call
+    """
+    snapshot = flag_snapshot.current()
+
+    etag = make_etag("changes", snapshot.fingerprint, since)
+    not_modified = conditional_response(if_none_match, response, etag, RUNTIME_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+
+    return {
+        "revision": snapshot.revision,
+        "changes": [rule.to_dict() for rule in snapshot.changes_after(since)]
+    }
+
+@router.get("/stream")
+async def stream_flag_changes(
+    last_event_id: Optional[str] = Header(None, description="Resume after this event id"),
+    since: Optional[int] = Query(None, description="Same as Last-Event-ID, for clients that cannot set headers")
+):
+    """
+    Server-sent events: a `flag_changed` event whenever a flag is toggled, re-rolled out or approved/rejected.
+    Event ids are ruleset revisions, shared by flags changed together; reconnecting with Last-Event-ID
+    replays every change from that revision on.
+    """
+    resume_from = since
+    if last_event_id:
+        try:
+            resume_from = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    return StreamingResponse(
+        flag_events.stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
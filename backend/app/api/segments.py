@@ -0,0 +1,136 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+from app.db.database import get_db, get_read_db
+from app.models.feature_flag import FeatureFlag
+from app.models.segment import Segment
+from app.services.flag_snapshot import flag_snapshot
+from app.services.flag_notifications import flag_notifier
+from app.services.revisions import next_revision
+from app.services.targeting import compile_rules, segment_names, user_set
+
+router = APIRouter()
+
+class SegmentCreate(BaseModel):
+    name: str
+    description: str = ""
+    user_ids: List[str] = []
+    rules: List[Dict[str, Any]] = []
+
+class SegmentUpdate(BaseModel):
+    description: Optional[str] = None
+    user_ids: Optional[List[str]] = None
+    rules: Optional[List[Dict[str, Any]]] = None
+
+def validated_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    try:
+        compile_rules(rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return rules
+
+async def flags_using(db: AsyncSession, name: str) -> List[FeatureFlag]:
+    """
+    Flags whose config targets or excludes a segment
+    """
+    flags = (await db.scalars(select(FeatureFlag).options(load_only(FeatureFlag.name, FeatureFlag.config)))).all()
+    return [flag for flag in flags if name in segment_names(flag.config or {})]
+
+async def get_segment_or_404(db: AsyncSession, name: str) -> Segment:
+    segment = await db.scalar(select(Segment).where(Segment.name == name))
+    if not segment:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return segment
+
+@router.post("/")
+async def create_segment(segment: SegmentCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Create a named segment that flags can list in target_segments / excluded_segments
+    """
+    existing = await db.scalar(select(Segment).where(Segment.name == segment.name))
+    if existing:
+        raise HTTPException(status_code=400, detail="Segment name already exists")
+
+    new_segment = Segment(
+        name=segment.name,
+        description=segment.description,
+        user_ids=sorted(user_set(segment.user_ids)),
+        rules=validated_rules(segment.rules)
+    )
+    db.add(new_segment)
+
+    # Flags may already reference the name; they now evaluate differently
+    revision = await next_revision(db)
+    new_segment.revision = revision
+    for flag in await flags_using(db, segment.name):
+        flag.revision = revision
+    await flag_notifier.publish(db, revision, segments=True)
+
+    await db.commit()
+    await db.refresh(new_segment)
+    await flag_snapshot.rebuild(db)
+
+    return new_segment.to_dict()
+
+@router.get("/")
+async def get_segments(db: AsyncSession = Depends(get_read_db)):
+    """
+    Get all segments, without their member lists
+    """
+    segments = (await db.scalars(select(Segment).order_by(Segment.name))).all()
+    return [segment.to_dict(include_users=False) for segment in segments]
+
+@router.get("/{name}")
+async def get_segment(name: str, db: AsyncSession = Depends(get_db)):
+    return (await get_segment_or_404(db, name)).to_dict()
+
+@router.put("/{name}")
+async def update_segment(name: str, update: SegmentUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Replace a segment's description, members or rules; fields left out are kept
+    Flags using the segment are stamped with the new revision so SDKs and streams pick up the change
+    """
+    segment = await get_segment_or_404(db, name)
+
+    if update.description is not None:
+        segment.description = update.description
+    if update.user_ids is not None:
+        segment.user_ids = sorted(user_set(update.user_ids))
+    if update.rules is not None:
+        segment.rules = validated_rules(update.rules)
+
+    revision = await next_revision(db)
+    segment.revision = revision
+    for flag in await flags_using(db, name):
+        flag.revision = revision
+    await flag_notifier.publish(db, revision, segments=True)
+
+    await db.commit()
+    await db.refresh(segment)
+    await flag_snapshot.rebuild(db)
+
+    return segment.to_dict()
+
+@router.delete("/{name}")
+async def delete_segment(name: str, db: AsyncSession = Depends(get_db)):
+    """
+    Delete a segment that no flag references
+    """
+    segment = await get_segment_or_404(db, name)
+
+    flags = await flags_using(db, name)
+    if flags:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Segment is used by flags: {', '.join(sorted(flag.name for flag in flags))}"
+        )
+
+    await db.delete(segment)
+    await flag_notifier.publish(db, await next_revision(db), segments=True)
+    await db.commit()
+    await flag_snapshot.rebuild(db)
+
+    return {"name": name, "deleted": True}
@@ -1,34 +1,56 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.db.database import engine, Base
-from app.api import flags, approvals, runtime
+from app.api import flags, approvals, segments
+from app.runtime_main import add_runtime_routes, start_runtime, stop_runtime
+from app.services.risk_analysis_worker import risk_analysis_workers
+from app.ai.ai_risk_analyzer import PROMPT_VERSION, get_risk_analyzer
+from app.ai.analysis_cache import analysis_cache
+from app.ai.similarity_index import similarity_index
+import asyncio
 import os
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema, flag snapshot, metrics and exposure log, as in the runtime-only app
+    runtime_tasks = await start_runtime()
+
+    # Cached analyses from an older prompt template or past their TTL are never served; clear them out
+    try:
+        await analysis_cache.purge_stale(PROMPT_VERSION)
+    except Exception as e:
+        print(f"Analysis cache purge failed: {str(e)}")
+
+    # Index past analyses for reuse in the background, then pick up new ones from every worker;
+    # lookups just miss until it is loaded
+    index_task = asyncio.create_task(similarity_index.run())
+
+    # The model SDK is imported on first use; load it off the event loop now so the first analysis doesn't wait
+    analyzer_task = asyncio.create_task(asyncio.to_thread(get_risk_analyzer))
+
+    # Risk analysis runs in background workers; resume anything left pending by the last shutdown
+    try:
+        await risk_analysis_workers.start()
+    except Exception as e:
+        print(f"Risk analysis workers failed to start: {str(e)}")
+
+    yield
+    await risk_analysis_workers.stop()
+    index_task.cancel()
+    analyzer_task.cancel()
+    await stop_runtime(runtime_tasks)
 
 app = FastAPI(
     title="Feature Flag System API",
     description="AI-Assisted Feature Flag & Approval Workflow",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        FRONTEND_URL,
-        "http://localhost:5173",
-        "https://ai-feature-flag-tool.vercel.app",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+add_runtime_routes(app)
 
 app.include_router(flags.router, prefix="/api/flags", tags=["flags"])
 app.include_router(approvals.router, prefix="/api/approvals", tags=["approvals"])
-app.include_router(runtime.router, prefix="/api/runtime", tags=["runtime"])
+app.include_router(segments.router, prefix="/api/segments", tags=["segments"])
 
 @app.get("/")
 async def root():
@@ -38,7 +60,3 @@ async def root():
         "health": "ok",
         "environment": os.getenv("ENVIRONMENT", "development")
     }
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
@@ -0,0 +1,8 @@
+# Import every model so relationship() targets resolve regardless of import order
+from app.models.feature_flag import FeatureFlag
+from app.models.risk_analysis import RiskAnalysis
+from app.models.approval import Approval
+from app.models.ruleset_revision import RulesetRevision
+from app.models.risk_analysis_cache import RiskAnalysisCache
+from app.models.segment import Segment
+from app.models.exposure_event import ExposureEvent
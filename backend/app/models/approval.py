@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 from app.db.database import Base
 import uuid
 from datetime import datetime
@@ -12,6 +13,11 @@ class ApprovalStatus(str, enum.Enum):
 
 class Approval(Base):
     __tablename__ = "approvals"
+    __table_args__ = (
+        Index("ix_approvals_flag_created", "flag_id", "created_at"),
+        Index("ix_approvals_approver_status", "approver_id", "status"),
+        Index("ix_approvals_created", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     flag_id = Column(UUID(as_uuid=True), ForeignKey("feature_flags.id"), nullable=False)
@@ -20,6 +26,8 @@ class Approval(Base):
     comment = Column(Text)
     approved_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    flag = relationship("FeatureFlag", back_populates="approvals")
     
     def to_dict(self):
         return {
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, Boolean, Float, BigInteger, Integer, Index
+from app.db.database import Base
+
+class ExposureEvent(Base):
+    """
+    One evaluation a user was exposed to, written in batches by the exposure logger
+    """
+    __tablename__ = "exposure_events"
+    __table_args__ = (
+        Index("ix_exposure_events_flag_time", "flag_name", "evaluated_at"),
+    )
+
+    # BigInteger on Postgres; SQLite only auto-increments INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    flag_name = Column(String(255), nullable=False)
+    user_id = Column(String(255), nullable=False)
+    enabled = Column(Boolean, nullable=False)
+    rollout_percentage = Column(Float)
+    evaluated_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "flag_name": self.flag_name,
+            "user_id": self.user_id,
+            "enabled": self.enabled,
+            "rollout_percentage": self.rollout_percentage,
+            "evaluated_at": self.evaluated_at.isoformat() if self.evaluated_at else None
+        }
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Text, DateTime, Enum, JSON, Float
+from sqlalchemy import Column, String, Text, DateTime, Enum, JSON, Float, BigInteger, Index, text
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 from app.db.database import Base
 import uuid
 from datetime import datetime
@@ -18,8 +19,20 @@ class RiskLevel(str, enum.Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
+class AnalysisStatus(str, enum.Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class FeatureFlag(Base):
     __tablename__ = "feature_flags"
+    __table_args__ = (
+        # Keep in sync with migrations/versions/0003_hot_path_indexes.py
+        Index("ix_feature_flags_active_name", "name",
+              postgresql_where=text("status = 'ACTIVE'"), sqlite_where=text("status = 'ACTIVE'")),
+        Index("ix_feature_flags_status_created", "status", "created_at", "id"),
+        Index("ix_feature_flags_created", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False, unique=True)
@@ -29,9 +42,16 @@ class FeatureFlag(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = Column(Enum(FlagStatus), default=FlagStatus.PENDING)
     risk_level = Column(Enum(RiskLevel), nullable=True)
-    config = Column(JSON, default={})  # {"rollout_percentage": 10, "target_users": []}
+    config = Column(JSON, default={})  # {"rollout_percentage": 10, "target_users": []}, see app/services/targeting.py
     code_changes = Column(Text)  # Description of code changes
     scope = Column(String(255))  # "frontend", "backend", "database", "all"
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")  # Ruleset revision of the last change
+    analysis_status = Column(Enum(AnalysisStatus), nullable=False, default=AnalysisStatus.PENDING, server_default="COMPLETED")
+    analysis_claimed_at = Column(DateTime, nullable=True)  # Set while a risk analysis worker is analyzing this flag
+
+    # Always eager load these (selectinload) - lazy loads are not available on AsyncSession
+    risk_analyses = relationship("RiskAnalysis", back_populates="flag", order_by="RiskAnalysis.analyzed_at")
+    approvals = relationship("Approval", back_populates="flag", order_by="Approval.created_at")
     
     def to_dict(self):
         return {
@@ -45,5 +65,7 @@ class FeatureFlag(Base):
             "risk_level": self.risk_level.value if self.risk_level else None,
             "config": self.config,
             "code_changes": self.code_changes,
-            "scope": self.scope
+            "scope": self.scope,
+            "revision": self.revision,
+            "analysis_status": self.analysis_status.value if self.analysis_status else None
         }
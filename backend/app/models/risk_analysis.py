@@ -1,11 +1,16 @@
-from sqlalchemy import Column, String, Text, DateTime, Float, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, DateTime, Float, ForeignKey, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 from app.db.database import Base
 import uuid
 from datetime import datetime
 
 class RiskAnalysis(Base):
     __tablename__ = "risk_analyses"
+    __table_args__ = (
+        Index("ix_risk_analyses_flag_analyzed", "flag_id", "analyzed_at"),
+        Index("ix_risk_analyses_analyzed", "analyzed_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     flag_id = Column(UUID(as_uuid=True), ForeignKey("feature_flags.id"), nullable=False)
@@ -14,6 +19,8 @@ class RiskAnalysis(Base):
     detected_issues = Column(JSON, default=[])  # ["database_migration", "auth_change"]
     recommendation = Column(Text)  # AI's recommendation for approval process
     analyzed_at = Column(DateTime, default=datetime.utcnow)
+
+    flag = relationship("FeatureFlag", back_populates="risk_analyses")
     
     def to_dict(self):
         return {
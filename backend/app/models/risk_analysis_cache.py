@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, JSON, Index
+from app.db.database import Base
+from datetime import datetime
+
+class RiskAnalysisCache(Base):
+    """
+    Persistent tier of the risk analysis cache, keyed by a hash of the prompt inputs, model and prompt version
+    """
+    __tablename__ = "risk_analysis_cache"
+    __table_args__ = (
+        Index("ix_risk_analysis_cache_expires", "expires_at"),
+    )
+
+    cache_key = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(32), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "cache_key": self.cache_key,
+            "model": self.model,
+            "prompt_version": self.prompt_version,
+            "result": self.result,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None
+        }
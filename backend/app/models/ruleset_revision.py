@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, DDL, event
+from app.db.database import Base
+
+class RulesetRevision(Base):
+    """
+    Single-row counter for the global ruleset revision
+    """
+    __tablename__ = "ruleset_revision"
+
+    id = Column(Integer, primary_key=True, default=1)
+    revision = Column(BigInteger, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "revision": self.revision
+        }
+
+event.listen(
+    RulesetRevision.__table__,
+    "after_create",
+    DDL("INSERT INTO ruleset_revision (id, revision) VALUES (1, 0)")
+)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Text, DateTime, JSON, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.database import Base
+import uuid
+from datetime import datetime
+
+class Segment(Base):
+    """
+    Named, reusable group of users that flags can target or exclude by name
+    """
+    __tablename__ = "segments"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String(255), nullable=False, unique=True)
+    description = Column(Text)
+    user_ids = Column(JSON, default=[])  # Explicit members
+    rules = Column(JSON, default=[])  # [{"attribute": "plan", "operator": "eq", "value": "enterprise"}], all must match
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")  # Ruleset revision of the last change
+
+    def to_dict(self, include_users: bool = True):
+        segment = {
+            "id": str(self.id),
+            "name": self.name,
+            "description": self.description,
+            "user_count": len(self.user_ids or []),
+            "rules": self.rules or [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "revision": self.revision
+        }
+        if include_users:
+            segment["user_ids"] = self.user_ids or []
+        return segment
@@ -0,0 +1,143 @@
+"""
+Runtime-only app: flag evaluation (/api/runtime), /health and /metrics, without the admin API,
+the risk analysis workers or any LLM SDK, so it imports and starts quickly.
+
+    uvicorn app.runtime_main:app
+
+app.main serves the same routes plus the admin API, and reuses the setup below.
+"""
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.db.database import async_engine, Base
+from app.api import runtime
+from app.services.flag_snapshot import REFRESH_INTERVAL_SECONDS, flag_snapshot
+from app.services.flag_notifications import FLAG_NOTIFY_REFRESH_SECONDS, flag_notifier
+from app.services.shared_snapshot import shared_snapshot
+from app.services.exposure_log import exposure_log
+from app.services.metrics import LatencyMiddleware, metrics
+import app.models  # Every table, for create_all
+import asyncio
+import os
+
+# Create missing tables at startup; turn off where alembic manages the schema
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "true").lower() == "true"
+
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+
+async def create_schema():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+def start_snapshot_upkeep() -> List[asyncio.Task]:
+    """
+    Keep the flag snapshot fresh from the database in the background
+    """
+    # Changes made by other workers arrive as notifications (PostgreSQL); polling is then only a safety net
+    tasks = [asyncio.create_task(flag_snapshot.refresh_periodically(
+        FLAG_NOTIFY_REFRESH_SECONDS if flag_notifier.enabled else REFRESH_INTERVAL_SECONDS
+    ))]
+    if flag_notifier.enabled:
+        tasks.append(asyncio.create_task(flag_notifier.run()))
+    return tasks
+
+async def start_runtime() -> List[asyncio.Task]:
+    """
+    Startup for flag evaluation; returns the background tasks for stop_runtime
+    """
+    if DB_CREATE_ALL:
+        try:
+            await create_schema()
+        except Exception as e:
+            print(f"Schema creation failed: {str(e)}")
+
+    # Load the runtime flag snapshot before serving, then keep it fresh in the background.
+    # With a shared snapshot, only the leader worker on this host does that; the others map its file.
+    try:
+        if shared_snapshot.enabled:
+            await shared_snapshot.start()
+        else:
+            await flag_snapshot.reload()
+    except Exception as e:
+        print(f"Initial flag snapshot load failed: {str(e)}")
+
+    if shared_snapshot.enabled:
+        tasks = [asyncio.create_task(shared_snapshot.run(start_snapshot_upkeep))]
+    else:
+        tasks = start_snapshot_upkeep()
+
+    # With METRICS_DIR set, each worker publishes its counters there for /metrics on any worker
+    if metrics.directory:
+        tasks.append(asyncio.create_task(metrics.flush_periodically()))
+
+    # Exposure events are buffered by the runtime endpoints and written out in batches here
+    if exposure_log.enabled:
+        tasks.append(asyncio.create_task(exposure_log.run()))
+
+    return tasks
+
+async def stop_runtime(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    if exposure_log.enabled:
+        await exposure_log.close()
+    if metrics.directory:
+        metrics.remove()
+
+async def get_metrics():
+    """
+    Evaluation counters and runtime latency in Prometheus text format, across all workers
+    """
+    return PlainTextResponse(
+        await asyncio.to_thread(metrics.render),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+async def health_check():
+    return {"status": "healthy"}
+
+def add_runtime_routes(app: FastAPI):
+    """
+    CORS, the runtime router with its latency histograms, /health and /metrics
+    """
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            FRONTEND_URL,
+            "http://localhost:5173",
+            "https://ai-feature-flag-tool.vercel.app",
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor"],
+    )
+
+    app.include_router(runtime.router, prefix="/api/runtime", tags=["runtime"])
+
+    # Latency histograms for the runtime evaluation endpoints (the SSE stream is long-lived, so not timed)
+    app.add_middleware(
+        LatencyMiddleware,
+        paths=[f"/api/runtime{route.path}" for route in runtime.router.routes if route.path != "/stream"],
+        metrics=metrics
+    )
+
+    app.add_api_route("/health", health_check, methods=["GET"])
+    app.add_api_route("/metrics", get_metrics, methods=["GET"], response_class=PlainTextResponse)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = await start_runtime()
+    yield
+    await stop_runtime(tasks)
+
+app = FastAPI(
+    title="Feature Flag Runtime API",
+    description="Flag evaluation for services and SDKs",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+add_runtime_routes(app)
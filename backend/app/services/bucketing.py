@@ -0,0 +1,138 @@
+import hashlib
+import os
+from typing import Dict, List, Sequence
+
+try:
+    import xxhash
+except ImportError:  # Optional, the stdlib engines are always available
+    xxhash = None
+
+# Buckets are expressed in basis points: 0-9999, i.e. 0.01% granularity
+BUCKET_SCALE = 10000
+
+# Engine stamped on newly created flags; flags without one keep the legacy engine
+LEGACY_ENGINE = "md5-legacy"
+DEFAULT_ENGINE = os.getenv("BUCKETING_ENGINE", LEGACY_ENGINE)
+
+class BucketingEngine:
+    """
+    Maps (salt, user_id) to a stable bucket in [0, BUCKET_SCALE)
+    """
+    name = ""
+
+    def new_hash(self, data: bytes):
+        raise NotImplementedError
+
+    def to_bucket(self, digest: bytes) -> int:
+        raise NotImplementedError
+
+    def bucket(self, salt: str, user_id: str) -> int:
+        return self.to_bucket(self.new_hash(f"{salt}:{user_id}".encode()).digest())
+
+    def buckets(self, salt: str, user_ids: Sequence[bytes]) -> List[int]:
+        """
+        Buckets for many users at once; the salt prefix is hashed once and the state copied per user
+        """
+        prefix = self.new_hash(f"{salt}:".encode())
+        to_bucket = self.to_bucket
+        buckets = []
+        for user_id in user_ids:
+            h = prefix.copy()
+            h.update(user_id)
+            buckets.append(to_bucket(h.digest()))
+        return buckets
+
+class MD5LegacyEngine(BucketingEngine):
+    """
+    Reproduces the original int(md5(...).hexdigest(), 16) % 100 assignment.
+    The legacy percentage bucket is the high part of the basis-point bucket, so
+    bucket < pct * 100 exactly when the old hash < pct, while the low part adds sub-percent resolution.
+    """
+    name = LEGACY_ENGINE
+
+    def new_hash(self, data: bytes):
+        return hashlib.md5(data)
+
+    def to_bucket(self, digest: bytes) -> int:
+        value = int.from_bytes(digest, "big") % BUCKET_SCALE
+        return (value % 100) * 100 + value // 100
+
+    def bucket(self, salt: str, user_id: str) -> int:
+        value = int.from_bytes(hashlib.md5(f"{salt}:{user_id}".encode()).digest(), "big") % BUCKET_SCALE
+        return (value % 100) * 100 + value // 100
+
+class Blake2bEngine(BucketingEngine):
+    """
+    64-bit BLAKE2b digest, computed in C straight from the input bytes
+    """
+    name = "blake2b-64"
+
+    def new_hash(self, data: bytes):
+        return hashlib.blake2b(data, digest_size=8)
+
+    def to_bucket(self, digest: bytes) -> int:
+        return int.from_bytes(digest, "little") % BUCKET_SCALE
+
+    def bucket(self, salt: str, user_id: str) -> int:
+        digest = hashlib.blake2b(f"{salt}:{user_id}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % BUCKET_SCALE
+
+class XXH64Engine(BucketingEngine):
+    """
+    Non-cryptographic xxHash64, available when the xxhash package is installed
+    """
+    name = "xxh64"
+
+    def new_hash(self, data: bytes):
+        return xxhash.xxh64(data)
+
+    def to_bucket(self, digest: bytes) -> int:
+        return int.from_bytes(digest, "big") % BUCKET_SCALE
+
+    def bucket(self, salt: str, user_id: str) -> int:
+        return xxhash.xxh64_intdigest(f"{salt}:{user_id}".encode()) % BUCKET_SCALE
+
+    def buckets(self, salt: str, user_ids: Sequence[bytes]) -> List[int]:
+        # Hashing the concatenation is cheaper than copying xxhash state
+        prefix = f"{salt}:".encode()
+        intdigest = xxhash.xxh64_intdigest
+        return [intdigest(prefix + user_id) % BUCKET_SCALE for user_id in user_ids]
+
+ENGINES: Dict[str, BucketingEngine] = {
+    engine.name: engine for engine in (MD5LegacyEngine(), Blake2bEngine())
+}
+
+if xxhash is not None:
+    ENGINES[XXH64Engine.name] = XXH64Engine()
+
+def get_engine(name: str = LEGACY_ENGINE) -> BucketingEngine:
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown bucketing engine: {name}")
+
+def rollout_threshold(rollout_percentage: float) -> int:
+    """
+    Convert a rollout percentage (e.g. 10 or 0.1) to a basis-point threshold
+    """
+    return round(rollout_percentage * (BUCKET_SCALE // 100))
+
+def normalize_rollout(rollout_percentage: float) -> float:
+    """
+    Validate a rollout percentage (0 to 100) and round it to two decimals (basis points); raises ValueError
+    """
+    if isinstance(rollout_percentage, bool) or not isinstance(rollout_percentage, (int, float)):
+        raise ValueError("Rollout percentage must be a number")
+    if not 0 <= rollout_percentage <= 100:
+        raise ValueError("Rollout percentage must be between 0 and 100")
+    rollout_percentage = round(rollout_percentage, 2)
+    return int(rollout_percentage) if float(rollout_percentage).is_integer() else rollout_percentage
+
+def format_bucket(bucket: int, rollout_percentage: float) -> str:
+    """
+    Bucket in percent units for reason strings.
+    Whole-percent rollouts show the integer hash (the legacy value), finer rollouts show two decimals.
+    """
+    if float(rollout_percentage).is_integer():
+        return str(bucket // 100)
+    return f"{bucket / 100:.2f}"
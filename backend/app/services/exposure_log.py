@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from app.db.database import AsyncSessionLocal
+from app.models.exposure_event import ExposureEvent
+from app.services.metrics import describe_counter, metrics
+
+EXPOSURE_LOG = os.getenv("EXPOSURE_LOG", "off").lower()  # "off", "file" or "db"
+EXPOSURE_SAMPLE_RATE = float(os.getenv("EXPOSURE_SAMPLE_RATE", "1.0"))
+EXPOSURE_BUFFER_SIZE = int(os.getenv("EXPOSURE_BUFFER_SIZE", "100000"))
+EXPOSURE_FLUSH_SECONDS = float(os.getenv("EXPOSURE_FLUSH_SECONDS", "1"))
+EXPOSURE_BATCH_SIZE = int(os.getenv("EXPOSURE_BATCH_SIZE", "5000"))
+EXPOSURE_LOG_DIR = os.getenv("EXPOSURE_LOG_DIR", "exposures")
+EXPOSURE_LOG_MAX_BYTES = int(os.getenv("EXPOSURE_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+EXPOSURE_LOG_BACKUPS = int(os.getenv("EXPOSURE_LOG_BACKUPS", "5"))
+
+SAMPLE_SCALE = 10000
+
+# (timestamp, flag_name, user_id, enabled, rollout_percentage)
+Exposure = Tuple[float, str, str, bool, Optional[float]]
+
+describe_counter("featureflag_exposures_logged_total", "Exposure events written to the exposure log sink")
+describe_counter("featureflag_exposures_dropped_total", "Exposure events dropped because the buffer was full")
+describe_counter("featureflag_exposures_failed_total", "Exposure events lost because the sink failed")
+
+class RotatingNdjsonSink:
+    """
+    Append-only NDJSON file per worker, rotated to .1 ... .N by size
+    """
+
+    def __init__(self, directory: str = EXPOSURE_LOG_DIR, max_bytes: int = EXPOSURE_LOG_MAX_BYTES,
+                 backups: int = EXPOSURE_LOG_BACKUPS):
+        os.makedirs(directory, exist_ok=True)
+        # One file per worker process, so workers never interleave writes or race on rotation
+        self.path = os.path.join(directory, f"exposures-{os.getpid()}.ndjson")
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, batch: List[Exposure]):
+        lines = "".join(
+            json.dumps({"ts": ts, "flag": flag, "user_id": user_id, "enabled": enabled, "rollout": rollout},
+                       separators=(",", ":")) + "\n"
+            for ts, flag, user_id, enabled, rollout in batch
+        )
+        self._file.write(lines)
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        self._file.close()
+
+class ExposureLogger:
+    """
+    Records which user saw which flag result, off the request path.
+    record() appends to a bounded in-memory buffer (deque appends are atomic) and never blocks or does I/O;
+    when the buffer is full the event is dropped and counted. A background task drains the buffer
+    in batches to a rotating NDJSON file or to the exposure_events table.
+    Sampling is by user, so a sampled user's exposures are all kept.
+    """
+
+    def __init__(self, sink: str = EXPOSURE_LOG, sample_rate: float = EXPOSURE_SAMPLE_RATE,
+                 buffer_size: int = EXPOSURE_BUFFER_SIZE, batch_size: int = EXPOSURE_BATCH_SIZE):
+        if sink not in ("off", "file", "db"):
+            print(f"Unknown EXPOSURE_LOG {sink!r}, exposure logging is off")
+            sink = "off"
+        self.sink = sink
+        self.enabled = sink != "off" and sample_rate > 0
+        self.sample_threshold = round(min(sample_rate, 1.0) * SAMPLE_SCALE)
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self._buffer: deque = deque()
+        self._file_sink: Optional[RotatingNdjsonSink] = None
+
+    def record(self, flag_name: str, user_id: str, enabled: bool, rollout_percentage: Optional[float]):
+        if not self.enabled:
+            return
+        if self.sample_threshold < SAMPLE_SCALE and zlib.crc32(user_id.encode()) % SAMPLE_SCALE >= self.sample_threshold:
+            return
+        if len(self._buffer) >= self.buffer_size:
+            metrics.count("featureflag_exposures_dropped_total")
+            return
+        self._buffer.append((time.time(), flag_name, user_id, enabled, rollout_percentage))
+
+    def _take(self) -> List[Exposure]:
+        batch = []
+        buffer = self._buffer
+        while buffer and len(batch) < self.batch_size:
+            batch.append(buffer.popleft())
+        return batch
+
+    async def _write(self, batch: List[Exposure]):
+        if self.sink == "file":
+            if self._file_sink is None:
+                self._file_sink = RotatingNdjsonSink()
+            await asyncio.to_thread(self._file_sink.write, batch)
+        else:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(ExposureEvent), [
+                    {
+                        "flag_name": flag,
+                        "user_id": user_id,
+                        "enabled": enabled,
+                        "rollout_percentage": rollout,
+                        "evaluated_at": datetime.utcfromtimestamp(ts)
+                    }
+                    for ts, flag, user_id, enabled, rollout in batch
+                ])
+                await db.commit()
+
+    async def flush(self):
+        """
+        Drain everything buffered so far, one batch at a time; a failed batch is dropped and counted
+        """
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                await self._write(batch)
+                metrics.count("featureflag_exposures_logged_total", len(batch))
+            except Exception as e:
+                print(f"Exposure log write failed, dropping {len(batch)} events: {str(e)}")
+                metrics.count("featureflag_exposures_failed_total", len(batch))
+
+    async def run(self, interval: float = EXPOSURE_FLUSH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def close(self):
+        """
+        Final flush on shutdown, after the run task is cancelled
+        """
+        await self.flush()
+        if self._file_sink:
+            self._file_sink.close()
+            self._file_sink = None
+
+exposure_log = ExposureLogger()
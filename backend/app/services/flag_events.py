@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Set
+from app.services.flag_snapshot import FlagSnapshot, flag_snapshot
+
+HEARTBEAT_SECONDS = float(os.getenv("FLAG_STREAM_HEARTBEAT_SECONDS", "15"))
+SUBSCRIBER_QUEUE_SIZE = 256
+RECONNECT_DELAY_MS = 3000
+
+# Pushed into a subscriber's queue when it fell too far behind and must catch up from the snapshot
+RESYNC = None
+
+@dataclass(frozen=True)
+class FlagEvent:
+    id: int  # Ruleset revision of the change
+    event: str
+    data: dict
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+
+class FlagEventBroadcaster:
+    """
+    Fans flag change events out to server-sent-event subscribers.
+    Event ids are ruleset revisions, so a reconnecting client resumes from Last-Event-ID
+    by replaying the snapshot's changes from that revision on, on any worker. Flags that share
+    the resumed revision are sent again, since the client may have missed some of them.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def publish(self, flag_event: FlagEvent):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(flag_event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its backlog and let it catch up from the snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def on_snapshot_swap(self, previous: FlagSnapshot, current: FlagSnapshot):
+        events = []
+        for name, rule in current.changed_since(previous):
+            if rule is None:
+                events.append(FlagEvent(current.revision, "flag_changed", {"name": name, "deleted": True}))
+            else:
+                events.append(FlagEvent(rule.revision, "flag_changed", rule.to_dict()))
+
+        for flag_event in sorted(events, key=lambda e: e.id):
+            self.publish(flag_event)
+
+    def catch_up(self, revision: int) -> List[FlagEvent]:
+        """
+        Changes at or after a revision; several flags can share one revision (an import chunk,
+        a segment change), so the client may have seen only part of that revision's group
+        """
+        return [
+            FlagEvent(rule.revision, "flag_changed", rule.to_dict())
+            for rule in flag_snapshot.current().changes_after(revision - 1)
+        ]
+
+    async def stream(self, last_event_id: Optional[int]) -> AsyncIterator[str]:
+        """
+        SSE body for one client; the response cancels this generator when the client disconnects
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+
+            # Events go out in revision order; a flag is sent at most once per revision
+            if last_event_id is None:
+                snapshot = flag_snapshot.current()
+                last_sent = snapshot.revision
+                sent = {rule.name for rule in snapshot.changes_after(last_sent - 1)}
+            else:
+                last_sent, sent = last_event_id, set()
+            pending = self.catch_up(last_sent)
+
+            while True:
+                for flag_event in pending:
+                    name = flag_event.data["name"]
+                    if flag_event.id > last_sent:
+                        last_sent, sent = flag_event.id, {name}
+                        yield flag_event.encode()
+                    elif flag_event.id == last_sent and name not in sent:
+                        sent.add(name)
+                        yield flag_event.encode()
+
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    pending = []
+                    continue
+
+                pending = self.catch_up(last_sent) if item is RESYNC else [item]
+        finally:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+flag_events = FlagEventBroadcaster()
+flag_snapshot.add_listener(flag_events.on_snapshot_swap)
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.ai.ai_risk_analyzer import get_risk_analyzer
+from app.ai.keyword_matcher import FALLBACK_REASONING_PREFIX
+from app.ai.similarity_index import similarity_index
+from app.models.feature_flag import AnalysisStatus, FeatureFlag, FlagStatus, RiskLevel
+from app.models.risk_analysis import RiskAnalysis
+from app.models.approval import Approval, ApprovalStatus
+from app.services.flag_notifications import flag_notifier
+from app.services.revisions import next_revision
+from app.services.risk_analysis_worker import APPROVER_MAPPING, DEFAULT_APPROVER, risk_analysis_workers
+
+IMPORT_CHUNK_SIZE = int(os.getenv("FLAG_IMPORT_CHUNK_SIZE", "500"))
+# Analyses started at once per chunk; the analyzer's own cap (AI_MAX_CONCURRENCY) still limits model calls
+IMPORT_ANALYSIS_CONCURRENCY = int(os.getenv("FLAG_IMPORT_ANALYSIS_CONCURRENCY", "8"))
+
+async def existing_names(db: AsyncSession, names: List[str]) -> set:
+    """
+    Names already taken, checked with one query per 1000 names
+    """
+    taken = set()
+    for i in range(0, len(names), 1000):
+        taken.update((await db.scalars(
+            select(FeatureFlag.name).where(FeatureFlag.name.in_(names[i:i + 1000]))
+        )).all())
+    return taken
+
+async def analyze_all(flag_data: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Risk analyses for a chunk, IMPORT_ANALYSIS_CONCURRENCY at a time.
+    Failures come back as exceptions in place of the result.
+    """
+    analyzer = get_risk_analyzer()
+    slots = asyncio.Semaphore(IMPORT_ANALYSIS_CONCURRENCY)
+
+    async def analyze(data: Dict[str, Any]) -> Dict[str, Any]:
+        async with slots:
+            return await analyzer.analyze_feature_flag_async(data)
+
+    return await asyncio.gather(*(analyze(data) for data in flag_data), return_exceptions=True)
+
+async def import_chunk(db: AsyncSession, rows: List[Dict[str, Any]], analyze: bool) -> List[Dict[str, Any]]:
+    """
+    Insert one chunk of validated rows (flags, then analyses and approvals) in a single transaction.
+    rows carry "row", "flag_data" and the FeatureFlag column values under "values".
+    Call with no transaction open on db. Returns one report entry per row.
+    """
+    # Analyze before the write transaction (and the revision lock held until commit) starts,
+    # so no pooled connection waits on the model
+    results = await analyze_all([row["flag_data"] for row in rows]) if analyze else [None] * len(rows)
+
+    now = datetime.utcnow()
+    revision = await next_revision(db)
+    flag_rows, analysis_rows, approval_rows, reports, reusable = [], [], [], [], []
+
+    for row, risk_result in zip(rows, results):
+        flag_id = uuid.uuid4()
+        values = dict(row["values"], id=flag_id, status=FlagStatus.PENDING, revision=revision,
+                      created_at=now, updated_at=now, risk_level=None, analysis_status=AnalysisStatus.PENDING)
+        report = {"row": row["row"], "name": values["name"], "status": "created", "id": str(flag_id)}
+
+        if analyze:
+            try:
+                if isinstance(risk_result, BaseException):
+                    raise risk_result
+                risk_level = RiskLevel(risk_result["risk_level"])
+                analysis_rows.append({
+                    "id": uuid.uuid4(),
+                    "flag_id": flag_id,
+                    "risk_score": risk_result["risk_score"],
+                    "ai_reasoning": risk_result["ai_reasoning"],
+                    "detected_issues": risk_result["detected_issues"],
+                    "recommendation": risk_result["recommendation"],
+                    "analyzed_at": now
+                })
+                values.update(risk_level=risk_level, analysis_status=AnalysisStatus.COMPLETED)
+                assigned_approver = APPROVER_MAPPING.get(risk_level.value, DEFAULT_APPROVER)
+                if not str(risk_result["ai_reasoning"]).startswith(FALLBACK_REASONING_PREFIX):
+                    reusable.append((flag_id, row["flag_data"]))
+            except Exception as e:
+                print(f"Risk analysis failed for {values['name']}: {str(e)}")
+                values["analysis_status"] = AnalysisStatus.FAILED
+                assigned_approver = DEFAULT_APPROVER
+
+            approval_rows.append({
+                "id": uuid.uuid4(),
+                "flag_id": flag_id,
+                "approver_id": assigned_approver,
+                "status": ApprovalStatus.PENDING,
+                "created_at": now
+            })
+            report.update(
+                analysis_status=values["analysis_status"].value,
+                risk_level=values["risk_level"].value if values.get("risk_level") else None,
+                required_approver=assigned_approver
+            )
+        else:
+            report["analysis_status"] = AnalysisStatus.PENDING.value
+
+        flag_rows.append(values)
+        reports.append(report)
+
+    # executemany / multi-row VALUES per table
+    await db.execute(insert(FeatureFlag), flag_rows)
+    if analysis_rows:
+        await db.execute(insert(RiskAnalysis), analysis_rows)
+    if approval_rows:
+        await db.execute(insert(Approval), approval_rows)
+    await flag_notifier.publish(db, revision, [values["name"] for values in flag_rows])
+    await db.commit()
+
+    for flag_id, flag_data in reusable:
+        similarity_index.add(flag_id, flag_data)
+    if not analyze:
+        for flag in flag_rows:
+            risk_analysis_workers.submit(flag["id"])
+
+    return reports
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import time
+from typing import Iterable, Optional
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import ASYNC_DATABASE_URL, AsyncSessionLocal
+from app.services.flag_snapshot import flag_snapshot
+from app.services.metrics import describe_counter, describe_histogram, metrics
+
+# "auto" turns notifications on when the database is PostgreSQL (the only one with LISTEN/NOTIFY); "true" or "false"
+FLAG_NOTIFY = os.getenv("FLAG_NOTIFY", "auto").lower()
+FLAG_NOTIFY_CHANNEL = os.getenv("FLAG_NOTIFY_CHANNEL", "flag_changes")
+# While listening, the periodic full refresh is only a safety net for lost notifications
+FLAG_NOTIFY_REFRESH_SECONDS = float(os.getenv("FLAG_NOTIFY_REFRESH_SECONDS", "300"))
+FLAG_NOTIFY_KEEPALIVE_SECONDS = float(os.getenv("FLAG_NOTIFY_KEEPALIVE_SECONDS", "10"))
+FLAG_NOTIFY_RECONNECT_SECONDS = float(os.getenv("FLAG_NOTIFY_RECONNECT_SECONDS", "30"))
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more; larger changes ask for a full reload
+MAX_PAYLOAD_BYTES = 7000
+
+describe_counter("featureflag_notifications_received_total", "Flag change notifications received, including this worker's own")
+describe_counter("featureflag_notify_reconnects_total", "Times the flag change listener lost or could not open its connection")
+describe_histogram(
+    "featureflag_notify_propagation_seconds",
+    "Time from a flag change on one worker to its snapshot swap on another (includes clock skew across hosts)"
+)
+
+def listener_dsn(url: str) -> str:
+    """
+    asyncpg connection string for the SQLAlchemy async URL (postgresql+asyncpg:// -> postgresql://)
+    """
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+class FlagNotifier:
+    """
+    Pushes flag changes to every worker through PostgreSQL LISTEN/NOTIFY.
+    Writers publish inside their transaction, so a notification is delivered exactly when the change
+    commits (and never for a rollback). Each worker listens on one dedicated connection and re-reads
+    only the flags named in the notification; after connecting or reconnecting it reloads in full,
+    since notifications sent while it was not listening are lost.
+    """
+
+    def __init__(self, database_url: str = ASYNC_DATABASE_URL, mode: str = FLAG_NOTIFY,
+                 channel: str = FLAG_NOTIFY_CHANNEL):
+        is_postgres = make_url(database_url).get_backend_name() == "postgresql"
+        self.enabled = mode == "true" or (mode == "auto" and is_postgres)
+        self.database_url = database_url
+        self.channel = channel
+        self.connected = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def publish(self, db: AsyncSession, revision: int, flags: Iterable[str] = (), segments: bool = False):
+        """
+        Queue a notification in the caller's transaction: the flags changed at this revision,
+        or segments=True when a segment changed (receivers then reload in full)
+        """
+        if not self.enabled:
+            return
+        change = {"revision": revision, "flags": sorted(set(flags)), "segments": segments, "sent_at": time.time()}
+        payload = json.dumps(change, separators=(",", ":"))
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            payload = json.dumps({"revision": revision, "flags": [], "segments": True, "sent_at": change["sent_at"]})
+        await db.execute(select(func.pg_notify(self.channel, payload)))
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            self._queue.put_nowait(json.loads(payload))
+        except ValueError:
+            print(f"Ignoring malformed flag notification: {payload[:200]}")
+
+    def _is_applied(self, change: dict) -> bool:
+        """
+        Whether the snapshot already has this change, e.g. this worker's own write or an earlier full reload
+        """
+        if change.get("segments"):
+            return False
+        snapshot = flag_snapshot.current()
+        rules = [snapshot.get(name) for name in change.get("flags", ())]
+        return all(rule is not None and rule.revision >= change["revision"] for rule in rules)
+
+    async def _apply_pending(self, first: dict):
+        """
+        Apply a notification plus everything queued behind it as one snapshot swap
+        """
+        changes = [first]
+        while not self._queue.empty():
+            change = self._queue.get_nowait()
+            if change is None:
+                self._queue.put_nowait(None)  # Connection lost; _listen sees it next
+                break
+            changes.append(change)
+        metrics.count("featureflag_notifications_received_total", len(changes))
+
+        changes = [change for change in changes if not self._is_applied(change)]
+        if not changes:
+            return
+
+        if any(change.get("segments") for change in changes):
+            await flag_snapshot.reload()
+        else:
+            names = {name for change in changes for name in change.get("flags", ())}
+            async with AsyncSessionLocal() as db:
+                await flag_snapshot.apply_changes(db, names)
+
+        now = time.time()
+        for change in changes:
+            metrics.observe("featureflag_notify_propagation_seconds", max(0.0, now - change.get("sent_at", now)))
+
+    def _on_termination(self, connection):
+        self._queue.put_nowait(None)
+
+    async def _listen(self, connection):
+        while True:
+            try:
+                change = await asyncio.wait_for(self._queue.get(), FLAG_NOTIFY_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # An idle connection can die silently; a round trip finds out within the keepalive interval
+                await connection.fetchval("SELECT 1")
+                continue
+            if change is None:
+                raise ConnectionError("listener connection closed")
+            await self._apply_pending(change)
+
+    async def run(self):
+        """
+        Listen until cancelled, reconnecting with backoff
+        """
+        backoff = 1.0
+        while True:
+            connection: Optional[asyncpg.Connection] = None
+            try:
+                connection = await asyncpg.connect(listener_dsn(self.database_url))
+                connection.add_termination_listener(self._on_termination)
+                await connection.add_listener(self.channel, self._on_notification)
+                # Listening first, then reloading, so nothing committed in between is missed;
+                # whatever is still queued from an earlier connection is covered by the reload
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                await flag_snapshot.reload()
+                self.connected = True
+                backoff = 1.0
+                await self._listen(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Flag change listener failed, reconnecting in {backoff:.0f}s: {str(e)}")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close(timeout=5)
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, FLAG_NOTIFY_RECONNECT_SECONDS)
+            metrics.count("featureflag_notify_reconnects_total")
+
+flag_notifier = FlagNotifier()
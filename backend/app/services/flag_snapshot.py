@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import AsyncSessionLocal, ReadSessionLocal
+from app.services.bucketing import BucketingEngine, LEGACY_ENGINE, get_engine, rollout_threshold
+from app.services.targeting import SegmentRule, Targeting, compile_targeting, targeting_key
+from app.models.feature_flag import FeatureFlag, FlagStatus
+from app.models.segment import Segment
+from app.models.ruleset_revision import RulesetRevision
+
+# Safety-net refresh interval for picking up changes made outside this worker
+REFRESH_INTERVAL_SECONDS = float(os.getenv("FLAG_SNAPSHOT_REFRESH_SECONDS", "30"))
+
+@dataclass(frozen=True, slots=True)
+class FlagRule:
+    """
+    Compact, immutable evaluation rule compiled from a FeatureFlag row
+    """
+    name: str
+    status: FlagStatus
+    rollout_percentage: Optional[float]  # None when the config does not set one
+    rollout_threshold: int  # Basis points, defaults to a full rollout
+    bucketing_salt: str
+    bucketing_engine: BucketingEngine
+    targeting: Optional[Targeting]  # None when the flag has no targeting, i.e. only the percentage rollout
+    revision: int
+
+    @classmethod
+    def from_flag(
+        cls,
+        flag: FeatureFlag,
+        segments: Mapping[str, SegmentRule] = MappingProxyType({}),
+        previous: Optional["FlagRule"] = None
+    ) -> "FlagRule":
+        """
+        Compile a flag; targeting is reused from the previous rule when neither the flag
+        nor its segments changed, so large user lists are not re-hashed on every rebuild
+        """
+        config = flag.config or {}
+        rollout_percentage = config.get("rollout_percentage")
+
+        try:
+            engine = get_engine(config.get("bucketing_engine", LEGACY_ENGINE))
+        except ValueError as e:
+            print(f"Flag {flag.name}: {str(e)}, using {LEGACY_ENGINE}")
+            engine = get_engine(LEGACY_ENGINE)
+
+        key = targeting_key(flag.revision or 0, config, segments)
+        if previous is not None and previous.targeting is not None and previous.targeting.key == key:
+            targeting = previous.targeting
+        else:
+            targeting = compile_targeting(flag.name, config, key, segments)
+
+        return cls(
+            name=flag.name,
+            status=flag.status,
+            rollout_percentage=rollout_percentage,
+            rollout_threshold=rollout_threshold(100 if rollout_percentage is None else rollout_percentage),
+            bucketing_salt=config.get("bucketing_salt") or flag.name,
+            bucketing_engine=engine,
+            targeting=targeting,
+            revision=flag.revision or 0
+        )
+
+    @property
+    def is_active(self) -> bool:
+        return self.status == FlagStatus.ACTIVE
+
+    def bucket(self, user_id: str) -> int:
+        return self.bucketing_engine.bucket(self.bucketing_salt, user_id)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "status": self.status.value if self.status else None,
+            "enabled": self.is_active,
+            "rollout_percentage": self.rollout_percentage,
+            "revision": self.revision
+        }
+
+    def to_ruleset_dict(self):
+        """
+        Everything a client needs to evaluate this flag locally
+        """
+        return {
+            "status": self.status.value if self.status else None,
+            "rollout_percentage": self.rollout_percentage,
+            "bucketing_salt": self.bucketing_salt,
+            "bucketing_engine": self.bucketing_engine.name,
+            "targeting": self.targeting.to_ruleset_dict() if self.targeting else None,
+            "revision": self.revision
+        }
+
+class FlagSnapshot:
+    """
+    Read-only view of every flag, keyed by name, and of the segments they can reference
+    """
+    __slots__ = ("flags", "active", "segments", "revision", "read_revision", "fingerprint", "built_at")
+
+    def __init__(self, rules: Iterable[FlagRule] = (), segments: Iterable[SegmentRule] = (), read_revision: int = 0):
+        rules = tuple(rules)
+        segments = tuple(segments)
+        self.flags: Mapping[str, FlagRule] = MappingProxyType({rule.name: rule for rule in rules})
+        self.active: Tuple[FlagRule, ...] = tuple(rule for rule in rules if rule.is_active)
+        self.segments: Mapping[str, SegmentRule] = MappingProxyType({segment.name: segment for segment in segments})
+        self.revision = max((rule.revision for rule in rules), default=0)
+        # Global ruleset revision when the rows were read (0 if unknown); also moves on segment deletes
+        self.read_revision = read_revision
+        self.fingerprint = self._fingerprint(rules, segments)
+        self.built_at = time.time()
+
+    @staticmethod
+    def _fingerprint(rules: Tuple[FlagRule, ...], segments: Tuple[SegmentRule, ...]) -> str:
+        """
+        Digest of everything evaluation depends on, used for ETags
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for rule in sorted(rules, key=lambda rule: rule.name):
+            h.update(repr((
+                rule.name, rule.status.value if rule.status else None, rule.rollout_percentage,
+                rule.bucketing_salt, rule.bucketing_engine.name,
+                rule.targeting.key if rule.targeting else None, rule.revision
+            )).encode())
+        for segment in sorted(segments, key=lambda segment: segment.name):
+            h.update(repr((segment.name, segment.revision)).encode())
+        return h.hexdigest()
+
+    def get(self, flag_name: str) -> Optional[FlagRule]:
+        return self.flags.get(flag_name)
+
+    def changed_since(self, previous: "FlagSnapshot") -> List[Tuple[str, Optional[FlagRule]]]:
+        """
+        (name, rule) pairs that differ from a previous snapshot; rule is None for removed flags
+        """
+        changes = [(name, rule) for name, rule in self.flags.items() if previous.get(name) != rule]
+        changes.extend((name, None) for name in previous.flags if name not in self.flags)
+        return changes
+
+    def changes_after(self, revision: int) -> List[FlagRule]:
+        """
+        Rules changed after a ruleset revision, oldest first
+        """
+        return sorted(
+            (rule for rule in self.flags.values() if rule.revision > revision),
+            key=lambda rule: rule.revision
+        )
+
+# Called with (previous, current) after every swap except the initial load
+SnapshotListener = Callable[[FlagSnapshot, FlagSnapshot], None]
+
+class FlagSnapshotStore:
+    """
+    Holds the current snapshot for this worker.
+    Rebuilds create a brand new snapshot and swap the reference, so readers never see a partial update.
+    """
+
+    def __init__(self):
+        self._snapshot = FlagSnapshot()
+        self._loaded = False
+        self._listeners: List[SnapshotListener] = []
+
+    def current(self) -> FlagSnapshot:
+        return self._snapshot
+
+    def add_listener(self, listener: SnapshotListener):
+        self._listeners.append(listener)
+
+    def swap(self, snapshot: FlagSnapshot) -> FlagSnapshot:
+        previous, self._snapshot = self._snapshot, snapshot
+
+        if self._loaded:
+            for listener in self._listeners:
+                try:
+                    listener(previous, snapshot)
+                except Exception as e:
+                    print(f"Flag snapshot listener failed: {str(e)}")
+        self._loaded = True
+
+        return snapshot
+
+    @staticmethod
+    def compile_rule(flag: FeatureFlag, segments: Mapping[str, SegmentRule],
+                     previous: Optional[FlagRule]) -> Optional[FlagRule]:
+        """
+        Compile one row; a row that cannot be compiled keeps its last good rule (or is left out)
+        instead of failing the whole snapshot
+        """
+        try:
+            return FlagRule.from_flag(flag, segments, previous)
+        except Exception as e:
+            print(f"Flag {flag.name}: invalid config, keeping its previous rule: {str(e)}")
+            return previous
+
+    async def load_segments(self, db: AsyncSession) -> Dict[str, SegmentRule]:
+        """
+        Compiled segments; only segments whose revision changed since the current snapshot are fetched in full
+        """
+        known = self._snapshot.segments
+        revisions = (await db.execute(select(Segment.name, Segment.revision))).all()
+
+        segments = {
+            name: known[name] for name, revision in revisions
+            if name in known and known[name].revision == (revision or 0)
+        }
+        changed = [name for name, _ in revisions if name not in segments]
+        if changed:
+            for segment in (await db.scalars(select(Segment).where(Segment.name.in_(changed)))).all():
+                segments[segment.name] = SegmentRule.from_segment(segment)
+        return segments
+
+    async def rebuild(self, db: AsyncSession) -> FlagSnapshot:
+        """
+        Swap in a snapshot of what db sees. Writers call this with their own (primary) session after committing.
+        Concurrent rebuilds can finish out of order and a replica may lag behind this worker's writes,
+        so a snapshot read at an older revision than the current one is discarded.
+        """
+        # Read first: the rows read next are at least this new
+        read_revision = await db.scalar(select(RulesetRevision.revision).where(RulesetRevision.id == 1)) or 0
+        segments = await self.load_segments(db)
+        flags = (await db.scalars(select(FeatureFlag))).all()
+        previous = self._snapshot.flags
+        rules = (self.compile_rule(flag, segments, previous.get(flag.name)) for flag in flags)
+        snapshot = FlagSnapshot((rule for rule in rules if rule is not None), segments.values(), read_revision)
+        current = self._snapshot
+        if read_revision < current.read_revision or snapshot.revision < current.revision:
+            return current
+        return self.swap(snapshot)
+
+    async def apply_changes(self, db: AsyncSession, names: Iterable[str]) -> FlagSnapshot:
+        """
+        Re-read just the named flags and swap in a snapshot with them replaced; segment changes need a full rebuild.
+        A rule already at a newer revision than the row read here is kept.
+        """
+        segments = await self.load_segments(db)
+        names = list(names)
+        flags = (await db.scalars(select(FeatureFlag).where(FeatureFlag.name.in_(names)))).all() if names else []
+
+        # No awaits from here on, so no other rebuild can swap in between
+        current = self._snapshot
+        rules = dict(current.flags)
+        for flag in flags:
+            previous = current.get(flag.name)
+            if previous is None or (flag.revision or 0) >= previous.revision:
+                rule = self.compile_rule(flag, segments, previous)
+                if rule is not None:
+                    rules[flag.name] = rule
+        return self.swap(FlagSnapshot(rules.values(), segments.values(), current.read_revision))
+
+    async def reload(self, replica: bool = False) -> FlagSnapshot:
+        async with (ReadSessionLocal if replica else AsyncSessionLocal)() as db:
+            return await self.rebuild(db)
+
+    async def refresh_periodically(self, interval: float = REFRESH_INTERVAL_SECONDS):
+        # Picks up other workers' writes; reads go to the replica when there is one
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload(replica=True)
+            except Exception as e:
+                print(f"Flag snapshot refresh failed: {str(e)}")
+
+flag_snapshot = FlagSnapshotStore()
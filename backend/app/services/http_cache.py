@@ -0,0 +1,39 @@
+import hashlib
+import os
+from typing import Optional
+from fastapi import Response
+
+# Runtime reads are public and short-lived so CDNs and SDK HTTP caches can absorb polling
+RUNTIME_CACHE_CONTROL = os.getenv("RUNTIME_CACHE_CONTROL", "public, max-age=5, stale-while-revalidate=30")
+# Admin listings must always be revalidated, but a 304 still skips the heavy queries
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def conditional_response(
+    if_none_match: Optional[str],
+    response: Response,
+    etag: str,
+    cache_control: str
+) -> Optional[Response]:
+    """
+    Attach validators to the response; returns a 304 to send instead when the client copy is current
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,344 @@
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Directory shared by the workers on one host; each worker writes its own file there.
+# Unset means single-process: /metrics reports this worker only.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Totals of workers that have exited, so counters never go down when one does (Prometheus would see a reset)
+ARCHIVE_FILE = "archive.json"
+# Held shared while summing the files, exclusively while moving a worker's totals into the archive
+LOCK_FILE = "metrics.lock"
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# Flag label used for evaluations of names that are not flags, which would otherwise be unbounded
+UNKNOWN_FLAG = "__unknown__"
+
+EvaluationKey = Tuple[str, bool, str]  # (flag, enabled, reason)
+
+# Unlabelled counters other services increment with Metrics.count; name -> help text
+COUNTERS: Dict[str, str] = {}
+
+# Unlabelled histograms (LATENCY_BUCKETS) other services record with Metrics.observe; name -> help text
+HISTOGRAMS: Dict[str, str] = {}
+
+def describe_counter(name: str, help_text: str):
+    COUNTERS[name] = help_text
+
+def describe_histogram(name: str, help_text: str):
+    HISTOGRAMS[name] = help_text
+
+def new_histogram() -> List[float]:
+    # One count per bucket, the +Inf count, then the sum of observations
+    return [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+
+class _Shard:
+    """
+    One thread's counters; only that thread writes to it
+    """
+    __slots__ = ("evaluations", "latency", "counters", "histograms")
+
+    def __init__(self):
+        self.evaluations: Dict[EvaluationKey, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latency: Dict[str, List[float]] = {}  # endpoint -> histogram
+        self.histograms: Dict[str, List[float]] = {}  # name -> histogram
+
+class Metrics:
+    """
+    Evaluation counters and request latency histograms.
+    Recording only touches the calling thread's shard (no locks), so it costs well under a microsecond.
+    Reads merge every shard; with METRICS_DIR set they also merge the files the other workers flush.
+    """
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR):
+        self.directory = directory
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()  # Only taken when a thread records for the first time
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def count_evaluation(self, flag: str, enabled: bool, reason: str, count: int = 1):
+        self._shard().evaluations[(flag, enabled, reason)] += count
+
+    def count(self, name: str, amount: int = 1):
+        self._shard().counters[name] += amount
+
+    def observe_latency(self, endpoint: str, seconds: float):
+        record(self._shard().latency, endpoint, seconds)
+
+    def observe(self, name: str, seconds: float):
+        record(self._shard().histograms, name, seconds)
+
+    # Aggregation
+
+    def collect_local(self) -> dict:
+        """
+        This worker's totals; dict and list copies are atomic under the GIL, so writers never block
+        """
+        evaluations: Dict[EvaluationKey, int] = defaultdict(int)
+        latency: Dict[str, List[float]] = {}
+        counters: Dict[str, int] = defaultdict(int)
+        histograms: Dict[str, List[float]] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        for shard in shards:
+            for key, count in shard.evaluations.copy().items():
+                evaluations[key] += count
+            for endpoint, histogram in shard.latency.copy().items():
+                merge_histogram(latency, endpoint, list(histogram))
+            for name, count in shard.counters.copy().items():
+                counters[name] += count
+            for name, histogram in shard.histograms.copy().items():
+                merge_histogram(histograms, name, list(histogram))
+
+        return {
+            "evaluations": [[flag, enabled, reason, count] for (flag, enabled, reason), count in evaluations.items()],
+            "latency": latency,
+            "counters": counters,
+            "histograms": histograms
+        }
+
+    def _worker_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        """
+        Write this worker's totals for the other workers to read (atomic replace)
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._worker_path(os.getpid())
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.collect_local(), f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+
+    @contextmanager
+    def _locked(self, mode: int):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            yield  # Released when the file is closed
+
+    def _archive(self, path: str, totals: dict):
+        """
+        Add an exited worker's totals to the archive, then drop its file; needs the lock held exclusively
+        """
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        archived = read_totals(archive_path)
+        merged = merge_totals([archived, totals] if archived else [totals])
+        with open(f"{archive_path}.tmp", "w") as f:
+            json.dump(to_file(merged), f, separators=(",", ":"))
+        os.replace(f"{archive_path}.tmp", archive_path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def remove(self):
+        """
+        On shutdown, move this worker's totals into the archive and drop its file
+        """
+        if not self.directory:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            self._archive(self._worker_path(os.getpid()), self.collect_local())
+        # Archived now; start from zero in case this process keeps recording (e.g. the app is started again)
+        with self._shards_lock:
+            self._shards = []
+            self._local = threading.local()
+
+    def collect(self) -> dict:
+        """
+        Totals across every worker sharing METRICS_DIR, past and present (just this one without it)
+        """
+        totals = [self.collect_local()]
+        if self.directory:
+            own = self._worker_path(os.getpid())
+            paths = [path for path in glob.glob(os.path.join(self.directory, "metrics-*.json")) if path != own]
+
+            # Workers that died without archiving (e.g. killed): archive their last flushed totals for them
+            dead = [path for path in paths if not pid_alive(worker_pid(path))]
+            if dead:
+                with self._locked(fcntl.LOCK_EX):
+                    for path in dead:
+                        total = read_totals(path)
+                        if total is not None:  # Otherwise another worker got to it first
+                            self._archive(path, total)
+
+            with self._locked(fcntl.LOCK_SH):
+                archived = read_totals(os.path.join(self.directory, ARCHIVE_FILE))
+                if archived:
+                    totals.append(archived)
+                for path in paths:
+                    if path in dead:
+                        continue
+                    total = read_totals(path)
+                    if total:
+                        totals.append(total)
+
+        return merge_totals(totals)
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (0.0.4)
+        """
+        collected = self.collect()
+        lines = [
+            "# HELP featureflag_evaluations_total Flag evaluations by flag, result and reason",
+            "# TYPE featureflag_evaluations_total counter",
+        ]
+        for (flag, enabled, reason), count in sorted(collected["evaluations"].items()):
+            labels = format_labels(flag=flag, enabled="true" if enabled else "false", reason=reason)
+            lines.append(f"featureflag_evaluations_total{labels} {count}")
+
+        lines += [
+            "# HELP featureflag_request_duration_seconds Runtime API request latency",
+            "# TYPE featureflag_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(collected["latency"].items()):
+            lines += render_histogram("featureflag_request_duration_seconds", histogram, endpoint=endpoint)
+
+        for name, help_text in sorted(COUNTERS.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {collected['counters'].get(name, 0)}"]
+
+        for name, help_text in sorted(HISTOGRAMS.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            lines += render_histogram(name, collected["histograms"].get(name) or new_histogram())
+
+        return "\n".join(lines) + "\n"
+
+    async def flush_periodically(self, interval: float = METRICS_FLUSH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Metrics flush failed: {str(e)}")
+
+def read_totals(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Skipping metrics file {path}: {str(e)}")
+        return None
+
+def merge_totals(totals: Iterable[dict]) -> dict:
+    evaluations: Dict[EvaluationKey, int] = defaultdict(int)
+    latency: Dict[str, List[float]] = {}
+    counters: Dict[str, int] = defaultdict(int)
+    histograms: Dict[str, List[float]] = {}
+    for total in totals:
+        for flag, enabled, reason, count in total["evaluations"]:
+            evaluations[(flag, enabled, reason)] += count
+        for endpoint, histogram in total["latency"].items():
+            merge_histogram(latency, endpoint, histogram)
+        for name, count in total.get("counters", {}).items():
+            counters[name] += count
+        for name, histogram in total.get("histograms", {}).items():
+            merge_histogram(histograms, name, histogram)
+    return {"evaluations": evaluations, "latency": latency, "counters": counters, "histograms": histograms}
+
+def to_file(merged: dict) -> dict:
+    """
+    merge_totals output in the file format (evaluations as rows, since JSON keys are strings)
+    """
+    return {
+        "evaluations": [[flag, enabled, reason, count] for (flag, enabled, reason), count in merged["evaluations"].items()],
+        "latency": merged["latency"],
+        "counters": merged["counters"],
+        "histograms": merged["histograms"]
+    }
+
+def worker_pid(path: str) -> int:
+    return int(os.path.basename(path)[len("metrics-"):-len(".json")])
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+def record(histograms: Dict[str, List[float]], key: str, seconds: float):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = new_histogram()
+    histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    histogram[-1] += seconds
+
+def merge_histogram(latency: Dict[str, List[float]], endpoint: str, histogram: List[float]):
+    merged = latency.get(endpoint)
+    if merged is None:
+        latency[endpoint] = list(histogram)
+    else:
+        for i, value in enumerate(histogram):
+            merged[i] += value
+
+def render_histogram(name: str, histogram: List[float], **labels) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram):
+        cumulative += count
+        lines.append(f"{name}_bucket{format_labels(**labels, le=str(bound))} {int(cumulative)}")
+    suffix = format_labels(**labels) if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram[-1]}")
+    lines.append(f"{name}_count{suffix} {int(cumulative)}")
+    return lines
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+class LatencyMiddleware:
+    """
+    Plain ASGI middleware timing requests to a fixed set of paths (no per-request allocations otherwise)
+    """
+
+    def __init__(self, app, paths: Iterable[str], metrics: Metrics):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.metrics.observe_latency(scope["path"], time.perf_counter() - start)
+
+metrics = Metrics()
@@ -0,0 +1,38 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.feature_flag import FeatureFlag
+from app.models.ruleset_revision import RulesetRevision
+from app.services.flag_notifications import flag_notifier
+
+async def next_revision(db: AsyncSession) -> int:
+    """
+    Increment and return the global ruleset revision inside the caller's transaction.
+    The counter row stays locked until commit, so revisions become visible in increasing order.
+    """
+    revision = await db.scalar(
+        update(RulesetRevision)
+        .where(RulesetRevision.id == 1)
+        .values(revision=RulesetRevision.revision + 1)
+        .returning(RulesetRevision.revision)
+    )
+
+    if revision is None:
+        # Counter row missing (table created outside create_all), start it
+        db.add(RulesetRevision(id=1, revision=1))
+        await db.flush()
+        revision = 1
+
+    return revision
+
+async def current_revision(db: AsyncSession) -> int:
+    revision = await db.scalar(select(RulesetRevision.revision).where(RulesetRevision.id == 1))
+    return revision or 0
+
+async def stamp_revision(db: AsyncSession, flag: FeatureFlag) -> int:
+    """
+    Mark a flag as changed at a new ruleset revision; call before committing the change.
+    Other workers are notified when the transaction commits.
+    """
+    flag.revision = await next_revision(db)
+    await flag_notifier.publish(db, flag.revision, [flag.name])
+    return flag.revision
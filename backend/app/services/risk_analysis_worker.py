@@ -0,0 +1,254 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+from sqlalchemy import or_, select, update
+from app.db.database import AsyncSessionLocal
+from app.ai.ai_risk_analyzer import get_risk_analyzer
+from app.ai.keyword_matcher import FALLBACK_REASONING_PREFIX
+from app.ai.similarity_index import AI_REUSE_SKIP_MODEL, find_reusable_analysis, similarity_index
+from app.models.feature_flag import AnalysisStatus, FeatureFlag, RiskLevel
+from app.models.risk_analysis import RiskAnalysis
+from app.models.approval import Approval, ApprovalStatus
+from app.services.revisions import next_revision
+
+RISK_ANALYSIS_WORKERS = int(os.getenv("RISK_ANALYSIS_WORKERS", "4"))
+RISK_ANALYSIS_QUEUE_SIZE = int(os.getenv("RISK_ANALYSIS_QUEUE_SIZE", "1000"))
+# A claim older than this is from a worker that died mid-analysis; pending flags are also re-queued this often
+RISK_ANALYSIS_CLAIM_SECONDS = float(os.getenv("RISK_ANALYSIS_CLAIM_SECONDS", "300"))
+# How often a long-poll for an analysis re-checks the database, for flags analyzed by another process
+RISK_ANALYSIS_WAIT_POLL_SECONDS = float(os.getenv("RISK_ANALYSIS_WAIT_POLL_SECONDS", "0.5"))
+
+# Approver rules
+APPROVER_MAPPING = {
+    "low": "team-lead@company.com",
+    "medium": "senior-engineer@company.com",
+    "high": "engineering-manager@company.com",
+    "critical": "cto@company.com"
+}
+DEFAULT_APPROVER = "senior-engineer@company.com"
+
+class RiskAnalysisWorkerPool:
+    """
+    Runs AI risk analysis for new flags off the request path.
+    A fixed number of asyncio workers drain a bounded queue of flag ids and await the shared analyzer.
+    Flags stay PENDING in the database until analyzed, so anything not finished is queued again on startup
+    and every RISK_ANALYSIS_CLAIM_SECONDS.
+    """
+
+    def __init__(self, workers: int = RISK_ANALYSIS_WORKERS, queue_size: int = RISK_ANALYSIS_QUEUE_SIZE):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._queued: Set[uuid.UUID] = set()
+        self._waiters: Dict[uuid.UUID, Set[asyncio.Event]] = {}
+        self._overflowed = False
+
+    def submit(self, flag_id) -> bool:
+        """
+        Queue a flag for analysis; returns False when the queue is full (the flag is picked up later)
+        """
+        # Kept as UUIDs: the id column binds uuid.UUID, not str, on every driver (SQLite included)
+        flag_id = flag_id if isinstance(flag_id, uuid.UUID) else uuid.UUID(str(flag_id))
+        if flag_id in self._queued:
+            return True
+
+        try:
+            self._queue.put_nowait(flag_id)
+        except asyncio.QueueFull:
+            print(f"Risk analysis queue full, deferring flag {flag_id}")
+            self._overflowed = True
+            return False
+
+        self._queued.add(flag_id)
+        return True
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        if self.workers:
+            self._tasks.append(asyncio.create_task(self._requeue_periodically()))
+        await self.requeue_pending()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def requeue_pending(self):
+        """
+        Queue flags still waiting for analysis, oldest first
+        """
+        async with AsyncSessionLocal() as db:
+            flag_ids = (await db.scalars(
+                select(FeatureFlag.id)
+                .where(FeatureFlag.analysis_status == AnalysisStatus.PENDING)
+                .order_by(FeatureFlag.created_at)
+            )).all()
+
+        for flag_id in flag_ids:
+            if not self.submit(flag_id):
+                break
+
+    async def _requeue_periodically(self):
+        # Picks up flags whose worker died after claiming them, once the claim has expired
+        while True:
+            await asyncio.sleep(RISK_ANALYSIS_CLAIM_SECONDS)
+            try:
+                await self.requeue_pending()
+            except Exception as e:
+                print(f"Risk analysis requeue failed: {str(e)}")
+
+    async def wait_for(self, flag_id: uuid.UUID, timeout: float):
+        """
+        Wait until a flag's analysis is no longer pending, or the timeout passes.
+        A worker in this process wakes the wait at once; the database is re-checked every
+        RISK_ANALYSIS_WAIT_POLL_SECONDS for flags another process analyzes.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Registered before the first check, so a completion in between is not missed
+        event = asyncio.Event()
+        self._waiters.setdefault(flag_id, set()).add(event)
+        try:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    status = await db.scalar(select(FeatureFlag.analysis_status).where(FeatureFlag.id == flag_id))
+                remaining = deadline - loop.time()
+                if status != AnalysisStatus.PENDING or remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(RISK_ANALYSIS_WAIT_POLL_SECONDS, remaining))
+                    return
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            waiters = self._waiters.get(flag_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[flag_id]
+
+    async def _run(self):
+        while True:
+            flag_id = await self._queue.get()
+            try:
+                await self.analyze(flag_id)
+            except Exception as e:
+                print(f"Risk analysis worker failed for flag {flag_id}: {str(e)}")
+            finally:
+                self._queued.discard(flag_id)
+                for event in self._waiters.pop(flag_id, ()):
+                    event.set()
+                self._queue.task_done()
+
+            if self._overflowed and self._queue.empty():
+                self._overflowed = False
+                await self.requeue_pending()
+
+    async def analyze(self, flag_id: uuid.UUID):
+        """
+        Analyze one flag: claim it in a short transaction, call the model with no transaction open,
+        then save the result and create its approval request in a second transaction
+        """
+        claimed_at = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            # The claim keeps other workers and processes off this flag without holding a row lock
+            claimed = await db.execute(
+                update(FeatureFlag)
+                .where(
+                    FeatureFlag.id == flag_id,
+                    FeatureFlag.analysis_status == AnalysisStatus.PENDING,
+                    or_(
+                        FeatureFlag.analysis_claimed_at.is_(None),
+                        FeatureFlag.analysis_claimed_at < claimed_at - timedelta(seconds=RISK_ANALYSIS_CLAIM_SECONDS)
+                    )
+                )
+                .values(analysis_claimed_at=claimed_at, updated_at=FeatureFlag.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != 1:
+                return
+
+            flag = await db.scalar(select(FeatureFlag).where(FeatureFlag.id == flag_id))
+            flag_data = {
+                "name": flag.name,
+                "description": flag.description,
+                "scope": flag.scope,
+                "code_changes": flag.code_changes,
+                "config": flag.config
+            }
+            try:
+                reused = await find_reusable_analysis(db, flag_data) if AI_REUSE_SKIP_MODEL else None
+            except Exception as e:
+                print(f"Analysis reuse lookup failed: {str(e)}")
+                reused = None
+            await db.commit()
+
+        try:
+            if reused:
+                risk_result = {
+                    "risk_level": reused["risk_level"],
+                    "risk_score": reused["risk_score"],
+                    "detected_issues": reused["detected_issues"],
+                    "ai_reasoning": f"Reused from a {reused['similarity']:.0%} similar flag: {reused['ai_reasoning']}",
+                    "recommendation": reused["recommendation"]
+                }
+            else:
+                risk_result = await get_risk_analyzer().analyze_feature_flag_async(flag_data)
+            risk_level = RiskLevel(risk_result["risk_level"])
+        except Exception as e:
+            print(f"Risk analysis failed: {str(e)}")
+            risk_result = None
+
+        async with AsyncSessionLocal() as db:
+            flag = await db.scalar(
+                select(FeatureFlag)
+                .where(
+                    FeatureFlag.id == flag_id,
+                    FeatureFlag.analysis_status == AnalysisStatus.PENDING,
+                    FeatureFlag.analysis_claimed_at == claimed_at
+                )
+                .with_for_update()
+            )
+            if not flag:
+                return  # Claim expired and another worker took the flag over
+
+            if risk_result is not None:
+                db.add(RiskAnalysis(
+                    flag_id=flag.id,
+                    risk_score=risk_result["risk_score"],
+                    ai_reasoning=risk_result["ai_reasoning"],
+                    detected_issues=risk_result["detected_issues"],
+                    recommendation=risk_result["recommendation"]
+                ))
+                flag.risk_level = risk_level
+                flag.analysis_status = AnalysisStatus.COMPLETED
+                # Assign approver based on risk level
+                assigned_approver = APPROVER_MAPPING.get(risk_level.value, DEFAULT_APPROVER)
+                # Only model-made analyses are worth reusing for similar submissions
+                reusable = not str(risk_result["ai_reasoning"]).startswith(FALLBACK_REASONING_PREFIX)
+            else:
+                flag.analysis_status = AnalysisStatus.FAILED
+                assigned_approver = DEFAULT_APPROVER
+                reusable = False
+            flag.analysis_claimed_at = None
+
+            db.add(Approval(
+                flag_id=flag.id,
+                approver_id=assigned_approver,
+                status=ApprovalStatus.PENDING
+            ))
+            await next_revision(db)
+            await db.commit()
+            print(f" Created approval request for {assigned_approver} (Risk: {flag.risk_level})")
+
+            if reusable:
+                similarity_index.add(flag.id, flag_data)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+risk_analysis_workers = RiskAnalysisWorkerPool()
@@ -0,0 +1,314 @@
+"""
+Opt-in sharing of the flag snapshot between the uvicorn workers of one host.
+
+With FLAG_SNAPSHOT_SHARED_DIR set (ideally on tmpfs, e.g. /dev/shm/featureflags), one worker
+holds the leader lock. Only the leader loads flags from the database (startup, notifications,
+periodic refresh). It writes every new snapshot to a versioned file in that directory and then
+points the "current" file at it. The other workers poll "current", memory-map the new file, and
+swap it in. If the leader exits, its lock is released and the next worker to poll takes over.
+
+File layout, native byte order (the file never leaves the host):
+    header    magic, format, revision, metadata length (HEADER)
+    metadata  JSON: flags and segments, with user lists as [offsets position, count, blob position]
+    sections  per user list, 8-byte aligned: count uint64 user hashes in ascending order,
+              count + 1 uint64 offsets, then the UTF-8 IDs in hash order
+
+Flags, rules and predicates are small and are decoded into each worker. User lists, which hold
+nearly all of the bytes, stay in the shared mapping and are searched in place (SharedUserList).
+So per-host memory for them does not grow with the number of workers.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.models.feature_flag import FlagStatus
+from app.services.bucketing import get_engine
+from app.services.flag_snapshot import FlagRule, FlagSnapshot, flag_snapshot
+from app.services.targeting import (
+    EMPTY_SEGMENT_REVISION, Predicate, SegmentRule, SharedUserList, Targeting, UserList, user_hash
+)
+
+FLAG_SNAPSHOT_SHARED_DIR = os.getenv("FLAG_SNAPSHOT_SHARED_DIR")
+FLAG_SNAPSHOT_SHARED_POLL_SECONDS = float(os.getenv("FLAG_SNAPSHOT_SHARED_POLL_SECONDS", "0.5"))
+
+MAGIC = b"FFSNAP\x00\x01"
+FORMAT = 1
+HEADER = struct.Struct("=8sIIQQ")  # magic, format, reserved, revision, metadata length
+KEEP_FILES = 3  # Workers may still be opening the previous file when a new one is published
+CURRENT = "current"
+
+UserListRef = Tuple[int, int]  # section position, count
+
+class _Writer:
+    """
+    Accumulates the user-list sections after the metadata
+    """
+
+    def __init__(self):
+        self.sections: List[bytes] = []
+        self.size = 0
+
+    def add_users(self, users: UserList) -> UserListRef:
+        hashed = sorted((user_hash(user), user.encode()) for user in users)
+        hashes = np.fromiter((h for h, _ in hashed), dtype=np.uint64, count=len(hashed))
+        offsets = np.zeros(len(hashed) + 1, dtype=np.uint64)
+        np.cumsum([len(user) for _, user in hashed], out=offsets[1:])
+        position = self.size
+        self._append(hashes.tobytes() + offsets.tobytes() + b"".join(user for _, user in hashed))
+        return position, len(hashed)
+
+    def _append(self, data: bytes):
+        padding = -len(data) % 8
+        self.sections.append(data + b"\0" * padding)
+        self.size += len(data) + padding
+
+def encode_snapshot(snapshot: FlagSnapshot) -> bytes:
+    writer = _Writer()
+
+    segments = [
+        {
+            "name": segment.name,
+            "revision": segment.revision,
+            "users": writer.add_users(segment.users),
+            "rules": [predicate.to_dict() for predicate in segment.rules]
+        }
+        for segment in snapshot.segments.values()
+    ]
+
+    flags = []
+    for rule in snapshot.flags.values():
+        targeting = rule.targeting
+        flags.append({
+            "name": rule.name,
+            "status": rule.status.value if rule.status else None,
+            "rollout_percentage": rule.rollout_percentage,
+            "rollout_threshold": rule.rollout_threshold,
+            "bucketing_salt": rule.bucketing_salt,
+            "bucketing_engine": rule.bucketing_engine.name,
+            "revision": rule.revision,
+            "targeting": None if targeting is None else {
+                "key": targeting.key,
+                "invalid": targeting.invalid,
+                "target_users": writer.add_users(targeting.target_users),
+                "excluded_users": writer.add_users(targeting.excluded_users),
+                "target_segments": [segment.name for segment in targeting.target_segments],
+                "excluded_segments": [segment.name for segment in targeting.excluded_segments],
+                "rules": [predicate.to_dict() for predicate in targeting.rules]
+            }
+        })
+
+    metadata = json.dumps({"flags": flags, "segments": segments, "read_revision": snapshot.read_revision}, separators=(",", ":")).encode()
+    metadata += b" " * (-(HEADER.size + len(metadata)) % 8)  # JSON whitespace, so sections stay aligned
+    header = HEADER.pack(MAGIC, FORMAT, 0, snapshot.revision, len(metadata))
+    return b"".join([header, metadata, *writer.sections])
+
+def decode_snapshot(buffer: memoryview) -> FlagSnapshot:
+    """
+    Snapshot over a mapped file; its user lists keep referencing the buffer
+    """
+    magic, file_format, _, _, metadata_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC or file_format != FORMAT:
+        raise ValueError("Not a flag snapshot file of a supported format")
+    metadata = json.loads(bytes(buffer[HEADER.size:HEADER.size + metadata_length]))
+    base = HEADER.size + metadata_length
+
+    def users(ref: UserListRef) -> SharedUserList:
+        position, count = ref
+        start = base + position
+        hashes = np.frombuffer(buffer, dtype=np.uint64, count=count, offset=start)
+        offsets = np.frombuffer(buffer, dtype=np.uint64, count=count + 1, offset=start + 8 * count)
+        blob_start = start + 8 * (2 * count + 1)
+        return SharedUserList(hashes, offsets, buffer[blob_start:blob_start + int(offsets[-1])])
+
+    def predicates(rules: List[Dict[str, Any]]) -> Tuple[Predicate, ...]:
+        return tuple(Predicate.from_dict(rule) for rule in rules)
+
+    segments = {
+        segment["name"]: SegmentRule(segment["name"], segment["revision"], users(segment["users"]),
+                                     predicates(segment["rules"]))
+        for segment in metadata["segments"]
+    }
+
+    def resolve(names: List[str]) -> Tuple[SegmentRule, ...]:
+        return tuple(segments.get(name) or SegmentRule(name, EMPTY_SEGMENT_REVISION, frozenset(), ()) for name in names)
+
+    rules = []
+    for flag in metadata["flags"]:
+        targeting = flag["targeting"]
+        if targeting is not None:
+            revision, segment_revisions = targeting["key"]
+            targeting = Targeting(
+                key=(revision, tuple(tuple(entry) for entry in segment_revisions)),
+                target_users=users(targeting["target_users"]),
+                excluded_users=users(targeting["excluded_users"]),
+                target_segments=resolve(targeting["target_segments"]),
+                excluded_segments=resolve(targeting["excluded_segments"]),
+                rules=predicates(targeting["rules"]),
+                invalid=targeting["invalid"]
+            )
+        rules.append(FlagRule(
+            name=flag["name"],
+            status=FlagStatus(flag["status"]) if flag["status"] else None,
+            rollout_percentage=flag["rollout_percentage"],
+            rollout_threshold=flag["rollout_threshold"],
+            bucketing_salt=flag["bucketing_salt"],
+            bucketing_engine=get_engine(flag["bucketing_engine"]),
+            targeting=targeting,
+            revision=flag["revision"]
+        ))
+
+    return FlagSnapshot(rules, segments.values(), metadata.get("read_revision", 0))
+
+class SharedSnapshot:
+    """
+    Leader election, publishing and following for FLAG_SNAPSHOT_SHARED_DIR (see the module docstring)
+    """
+
+    def __init__(self, directory: Optional[str] = FLAG_SNAPSHOT_SHARED_DIR,
+                 poll_interval: float = FLAG_SNAPSHOT_SHARED_POLL_SECONDS):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.is_leader = False
+        self._lock_file = None
+        self._current_name: Optional[str] = None
+        self._published: List[str] = []
+        self._published_fingerprint: Optional[str] = None
+        self._pending: Optional[FlagSnapshot] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def try_lead(self) -> bool:
+        """
+        Take the leader lock if no live worker holds it; the OS releases it when the holder exits
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path("leader.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_leader = True
+        return True
+
+    # Leader
+
+    def write(self, snapshot: FlagSnapshot) -> str:
+        """
+        Write a snapshot file, point "current" at it and drop files older than the last KEEP_FILES
+        """
+        name = f"ruleset-{snapshot.revision}-{snapshot.fingerprint[:16]}.bin"
+        data = encode_snapshot(snapshot)
+        with open(self._path(f"{name}.tmp"), "wb") as f:
+            f.write(data)
+        os.replace(self._path(f"{name}.tmp"), self._path(name))
+        with open(self._path(f"{CURRENT}.tmp"), "w") as f:
+            f.write(name)
+        os.replace(self._path(f"{CURRENT}.tmp"), self._path(CURRENT))
+
+        self._published = [published for published in self._published if published != name] + [name]
+        for path in glob.glob(self._path("ruleset-*.bin")):
+            if os.path.basename(path) not in self._published[-KEEP_FILES:]:
+                os.remove(path)  # Workers that mapped it keep their mapping
+        return name
+
+    def _on_swap(self, previous: FlagSnapshot, current: FlagSnapshot):
+        self._pending = current
+        self._changed.set()
+
+    async def _publish_changes(self):
+        await self._changed.wait()
+        self._changed.clear()
+        snapshot, self._pending = self._pending, None
+        # Periodic refreshes usually change nothing, and adopting our own file swaps in an identical snapshot
+        if snapshot is None or snapshot.fingerprint == self._published_fingerprint:
+            return
+        name = await asyncio.to_thread(self.write, snapshot)
+        self._published_fingerprint = snapshot.fingerprint
+        # Serve from the mapped file too, unless a newer snapshot arrived meanwhile
+        if flag_snapshot.current() is snapshot:
+            self._adopt(name)
+
+    # Followers (and the leader, for its own files)
+
+    def _adopt(self, name: str) -> FlagSnapshot:
+        with open(self._path(name), "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        snapshot = decode_snapshot(memoryview(mapping))
+        self._current_name = name
+        if snapshot.revision >= flag_snapshot.current().revision:
+            flag_snapshot.swap(snapshot)
+        return snapshot
+
+    def follow(self) -> bool:
+        """
+        Swap in the leader's latest file if it changed; False when there is none yet
+        """
+        try:
+            with open(self._path(CURRENT)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if name and name != self._current_name:
+            try:
+                self._adopt(name)
+            except FileNotFoundError:
+                return False  # Replaced while we read "current"; the next poll gets the newer one
+        return True
+
+    async def start(self):
+        """
+        Become the leader or load the leader's snapshot before serving
+        """
+        if self.try_lead():
+            print(f"Shared flag snapshot: this worker (pid {os.getpid()}) loads and publishes")
+            await self._lead()
+        elif not self.follow():
+            # No leader has published yet; serve from the database until it does
+            await flag_snapshot.reload()
+
+    async def _lead(self):
+        flag_snapshot.add_listener(self._on_swap)
+        await flag_snapshot.reload()
+        # The initial load does not notify listeners; publish it explicitly
+        self._pending = flag_snapshot.current()
+        self._changed.set()
+
+    async def run(self, start_upkeep: Callable[[], List[asyncio.Task]]):
+        """
+        Follow until this worker wins the lock, then keep the snapshot fresh from the database
+        (start_upkeep starts the refresh and notification tasks) and publish every change
+        """
+        upkeep: List[asyncio.Task] = start_upkeep() if self.is_leader else []
+        try:
+            while True:
+                try:
+                    if self.is_leader:
+                        await self._publish_changes()
+                        continue
+                    if self.try_lead():
+                        print(f"Shared flag snapshot: worker {os.getpid()} took over as leader")
+                        await self._lead()
+                        upkeep = start_upkeep()
+                        continue
+                    self.follow()
+                except Exception as e:
+                    print(f"Shared flag snapshot failed: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            for task in upkeep:
+                task.cancel()
+
+shared_snapshot = SharedSnapshot()
@@ -0,0 +1,384 @@
+"""
+Per-flag targeting, evaluated before the percentage rollout.
+
+Flag config keys (all optional):
+    "target_users":      user IDs that always get the flag
+    "excluded_users":    user IDs that never get the flag (wins over everything else)
+    "target_segments":   segment names whose members always get the flag
+    "excluded_segments": segment names whose members never get the flag
+    "rules":             attribute predicates over the user context; all must match
+                         for the percentage rollout to apply, e.g.
+                         {"attribute": "country", "operator": "in", "value": ["US", "CA"]}
+
+The SDK mirrors this in sdk/python/featureflag_client/targeting.py.
+"""
+import base64
+import hashlib
+import math
+import os
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple, Union
+import numpy as np
+
+# User lists longer than this are shipped to SDKs as a bloom filter instead of the raw IDs
+TARGETING_INLINE_USERS = int(os.getenv("TARGETING_INLINE_USERS", "1000"))
+TARGETING_BLOOM_FP_RATE = float(os.getenv("TARGETING_BLOOM_FP_RATE", "0.001"))
+
+USER_LIST_KEYS = ("target_users", "excluded_users")
+SEGMENT_LIST_KEYS = ("target_segments", "excluded_segments")
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _compare(test: Callable[[float, float], bool]) -> Callable[[Any, Any], bool]:
+    def compare(actual, expected) -> bool:
+        actual = _number(actual)
+        return actual is not None and test(actual, expected)
+    return compare
+
+# operator -> (compile the configured value, test(actual, compiled value)); actual is never None here
+OPERATORS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any, Any], bool]]] = {
+    "eq": (str, lambda actual, expected: str(actual) == expected),
+    "neq": (str, lambda actual, expected: str(actual) != expected),
+    "in": (lambda value: frozenset(str(v) for v in value), lambda actual, expected: str(actual) in expected),
+    "not_in": (lambda value: frozenset(str(v) for v in value), lambda actual, expected: str(actual) not in expected),
+    "contains": (str, lambda actual, expected: expected in str(actual)),
+    "starts_with": (str, lambda actual, expected: str(actual).startswith(expected)),
+    "ends_with": (str, lambda actual, expected: str(actual).endswith(expected)),
+    "gt": (float, _compare(lambda actual, expected: actual > expected)),
+    "gte": (float, _compare(lambda actual, expected: actual >= expected)),
+    "lt": (float, _compare(lambda actual, expected: actual < expected)),
+    "lte": (float, _compare(lambda actual, expected: actual <= expected)),
+}
+
+class Predicate:
+    """
+    One attribute test over the user context; a missing attribute never matches
+    """
+    __slots__ = ("attribute", "operator", "value", "_compiled", "_test")
+
+    def __init__(self, attribute: str, operator: str, value: Any):
+        if not isinstance(attribute, str) or not attribute:
+            raise ValueError("Targeting rule needs an attribute name")
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown targeting operator: {operator}")
+        compile_value, test = OPERATORS[operator]
+        if operator in ("in", "not_in") and not isinstance(value, (list, tuple)):
+            raise ValueError(f"Operator {operator} needs a list value")
+        try:
+            self._compiled = compile_value(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for operator {operator}: {value!r}")
+        self.attribute = attribute
+        self.operator = operator
+        self.value = value
+        self._test = test
+
+    @classmethod
+    def from_dict(cls, rule: Any) -> "Predicate":
+        if not isinstance(rule, dict):
+            raise ValueError("Targeting rules must be objects")
+        return cls(rule.get("attribute"), rule.get("operator"), rule.get("value"))
+
+    def matches(self, context: Mapping[str, Any]) -> bool:
+        actual = context.get(self.attribute)
+        return actual is not None and self._test(actual, self._compiled)
+
+    def to_dict(self):
+        return {"attribute": self.attribute, "operator": self.operator, "value": self.value}
+
+def compile_rules(rules: Any) -> Tuple[Predicate, ...]:
+    if rules is None:
+        return ()
+    if not isinstance(rules, list):
+        raise ValueError("Targeting rules must be a list")
+    return tuple(Predicate.from_dict(rule) for rule in rules)
+
+def user_set(users: Any) -> FrozenSet[str]:
+    if users is None:
+        return frozenset()
+    if not isinstance(users, (list, tuple, set, frozenset)):
+        raise ValueError("User lists must be arrays of user IDs")
+    return frozenset(str(user) for user in users)
+
+class BloomFilter:
+    """
+    Compact membership screen for large user lists shipped to SDKs.
+    No false negatives; false positives at roughly TARGETING_BLOOM_FP_RATE, so a hit must be
+    confirmed with the server. Positions are (h1 + i * h2) mod 2**64 mod size_bits over a
+    128-bit blake2b digest of the user ID.
+    """
+    __slots__ = ("size_bits", "hashes", "bits")
+
+    def __init__(self, size_bits: int, hashes: int, bits: bytes):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bits
+
+    @classmethod
+    def from_users(cls, users: Iterable[str], fp_rate: float = TARGETING_BLOOM_FP_RATE) -> "BloomFilter":
+        users = list(users)
+        count = max(len(users), 1)
+        size_bits = max(64, math.ceil(-count * math.log(fp_rate) / math.log(2) ** 2 / 8) * 8)
+        hashes = max(1, round(size_bits / count * math.log(2)))
+
+        digests = np.frombuffer(
+            b"".join(hashlib.blake2b(user.encode(), digest_size=16).digest() for user in users),
+            dtype=">u8"
+        ).astype(np.uint64).reshape(-1, 2)
+        bits = np.zeros(size_bits // 8, dtype=np.uint8)
+        if len(users):
+            h1, h2 = digests[:, 0], digests[:, 1]
+            for i in range(hashes):
+                positions = (h1 + np.uint64(i) * h2) % np.uint64(size_bits)  # uint64 arithmetic wraps
+                np.bitwise_or.at(bits, positions >> np.uint64(3),
+                                 (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        return cls(size_bits, hashes, bits.tobytes())
+
+    def __contains__(self, user_id: str) -> bool:
+        digest = hashlib.blake2b(user_id.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big")
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & 0xFFFFFFFFFFFFFFFF) % self.size_bits
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def to_dict(self):
+        return {"size_bits": self.size_bits, "hashes": self.hashes, "bits": base64.b64encode(self.bits).decode()}
+
+def user_hash(user_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), "little")
+
+class SharedUserList:
+    """
+    Read-only user list over a shared buffer (see shared_snapshot.py): the users' 64-bit hashes in
+    ascending order, the UTF-8 IDs concatenated in the same order, and len + 1 offsets into them.
+    Lookups binary-search the hashes in place and confirm the ID, so the list is never copied
+    into the process.
+    """
+    __slots__ = ("_hashes", "_offsets", "_blob")
+
+    def __init__(self, hashes: np.ndarray, offsets: np.ndarray, blob: memoryview):
+        self._hashes = hashes
+        self._offsets = offsets
+        self._blob = blob
+
+    def _user(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets.item(i):self._offsets.item(i + 1)])
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, user_id: str) -> bool:
+        hashes = self._hashes
+        target = user_hash(user_id)
+        i = int(hashes.searchsorted(np.uint64(target)))
+        encoded = user_id.encode()
+        # Equal hashes are adjacent; item() avoids slow numpy scalar comparisons
+        while i < len(hashes) and hashes.item(i) == target:
+            if self._user(i) == encoded:
+                return True
+            i += 1
+        return False
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._user(i).decode()
+
+UserList = Union[FrozenSet[str], SharedUserList]
+
+def encode_users(users: UserList) -> Dict[str, Any]:
+    """
+    Ruleset form of a user list: the IDs themselves, or a bloom filter for long lists
+    """
+    if len(users) <= TARGETING_INLINE_USERS:
+        return {"users": sorted(users)}
+    return {"bloom": BloomFilter.from_users(users).to_dict(), "count": len(users)}
+
+class SegmentRule:
+    """
+    Compiled named segment: explicit members plus, optionally, attribute rules that all must match
+    """
+    __slots__ = ("name", "revision", "users", "rules", "_ruleset_dict")
+
+    def __init__(self, name: str, revision: int, users: UserList, rules: Tuple[Predicate, ...]):
+        self.name = name
+        self.revision = revision
+        self.users = users
+        self.rules = rules
+        self._ruleset_dict = None
+
+    @classmethod
+    def from_segment(cls, segment) -> "SegmentRule":
+        try:
+            rules = compile_rules(segment.rules)
+        except ValueError as e:
+            print(f"Segment {segment.name}: {str(e)}, ignoring its rules")
+            rules = ()
+        return cls(segment.name, segment.revision or 0, user_set(segment.user_ids), rules)
+
+    def contains(self, user_id: Optional[str], context: Mapping[str, Any]) -> bool:
+        if user_id is not None and user_id in self.users:
+            return True
+        return bool(self.rules) and all(predicate.matches(context) for predicate in self.rules)
+
+    def to_ruleset_dict(self):
+        if self._ruleset_dict is None:
+            self._ruleset_dict = {
+                "revision": self.revision,
+                "members": encode_users(self.users),
+                "rules": [predicate.to_dict() for predicate in self.rules]
+            }
+        return self._ruleset_dict
+
+EMPTY_SEGMENT_REVISION = -1  # Key entry for a referenced segment that does not exist (yet)
+
+class Targeting:
+    """
+    Compiled targeting for one flag. User lists are frozensets, so membership is O(1) however long they are
+    (or SharedUserLists when the snapshot comes from a shared file).
+    Instances are compared by key (flag revision plus the revisions of the segments it references),
+    so an unchanged flag reuses its compiled targeting across snapshot rebuilds.
+    """
+    __slots__ = ("key", "target_users", "excluded_users", "target_segments", "excluded_segments",
+                 "rules", "invalid", "_ruleset_dict")
+
+    def __init__(self, key: tuple, target_users: UserList = frozenset(),
+                 excluded_users: UserList = frozenset(), target_segments: Tuple[SegmentRule, ...] = (),
+                 excluded_segments: Tuple[SegmentRule, ...] = (), rules: Tuple[Predicate, ...] = (),
+                 invalid: bool = False):
+        self.key = key
+        self.target_users = target_users
+        self.excluded_users = excluded_users
+        self.target_segments = target_segments
+        self.excluded_segments = excluded_segments
+        self.rules = rules
+        self.invalid = invalid  # Config could not be compiled: nobody matches
+        self._ruleset_dict = None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Targeting) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def evaluate(self, user_id: Optional[str], context: Optional[Mapping[str, Any]] = None) -> Optional[Tuple[bool, str]]:
+        """
+        (enabled, reason) when targeting decides, None when the percentage rollout should
+        """
+        if self.invalid:
+            return False, "Invalid targeting config"
+
+        context = context or {}
+
+        if user_id is not None and user_id in self.excluded_users:
+            return False, "User is excluded"
+        for segment in self.excluded_segments:
+            if segment.contains(user_id, context):
+                return False, f"User is in excluded segment {segment.name}"
+
+        if user_id is not None and user_id in self.target_users:
+            return True, "User is targeted"
+        for segment in self.target_segments:
+            if segment.contains(user_id, context):
+                return True, f"User is in segment {segment.name}"
+
+        if self.rules and not all(predicate.matches(context) for predicate in self.rules):
+            return False, "Targeting rules not matched"
+
+        return None
+
+    def to_ruleset_dict(self):
+        if self.invalid:
+            return {"invalid": True}
+        if self._ruleset_dict is None:
+            self._ruleset_dict = {
+                "target_users": encode_users(self.target_users),
+                "excluded_users": encode_users(self.excluded_users),
+                "target_segments": [segment.name for segment in self.target_segments],
+                "excluded_segments": [segment.name for segment in self.excluded_segments],
+                "rules": [predicate.to_dict() for predicate in self.rules]
+            }
+        return self._ruleset_dict
+
+# Low-cardinality metric label for each reason Targeting.evaluate gives; segment names are dropped
+REASON_LABELS = (
+    ("User is excluded", "excluded"),
+    ("User is in excluded segment", "excluded_segment"),
+    ("User is targeted", "targeted"),
+    ("User is in segment", "segment"),
+    ("Targeting rules not matched", "rules_not_matched"),
+    ("Invalid targeting config", "invalid_targeting"),
+)
+
+def reason_label(reason: str) -> str:
+    for prefix, label in REASON_LABELS:
+        if reason.startswith(prefix):
+            return label
+    return "targeting"
+
+def segment_names(config: Mapping[str, Any]) -> Tuple[str, ...]:
+    """
+    Every segment a flag config references
+    """
+    names = []
+    for key in SEGMENT_LIST_KEYS:
+        names.extend(str(name) for name in config.get(key) or ())
+    return tuple(dict.fromkeys(names))
+
+def has_targeting(config: Mapping[str, Any]) -> bool:
+    return any(config.get(key) for key in USER_LIST_KEYS + SEGMENT_LIST_KEYS + ("rules",))
+
+def validate_targeting(config: Mapping[str, Any]):
+    """
+    Raise ValueError if the targeting part of a flag config cannot be compiled
+    """
+    for key in USER_LIST_KEYS:
+        user_set(config.get(key))
+    for key in SEGMENT_LIST_KEYS:
+        if not isinstance(config.get(key) or [], list):
+            raise ValueError(f"{key} must be a list of segment names")
+    compile_rules(config.get("rules"))
+
+def targeting_key(revision: int, config: Mapping[str, Any], segments: Mapping[str, SegmentRule]) -> tuple:
+    return (revision, tuple(
+        (name, segments[name].revision if name in segments else EMPTY_SEGMENT_REVISION)
+        for name in segment_names(config)
+    ))
+
+def compile_targeting(
+    name: str,
+    config: Mapping[str, Any],
+    key: tuple,
+    segments: Mapping[str, SegmentRule]
+) -> Optional[Targeting]:
+    """
+    Targeting for a flag config, or None when it has none.
+    Unknown segments have no members; a malformed config disables the flag rather than widening it.
+    """
+    if not has_targeting(config):
+        return None
+
+    def resolve(names_key: str) -> Tuple[SegmentRule, ...]:
+        return tuple(
+            segments.get(str(segment)) or SegmentRule(str(segment), EMPTY_SEGMENT_REVISION, frozenset(), ())
+            for segment in config.get(names_key) or ()
+        )
+
+    try:
+        validate_targeting(config)
+        return Targeting(
+            key=key,
+            target_users=user_set(config.get("target_users")),
+            excluded_users=user_set(config.get("excluded_users")),
+            target_segments=resolve("target_segments"),
+            excluded_segments=resolve("excluded_segments"),
+            rules=compile_rules(config.get("rules"))
+        )
+    except ValueError as e:
+        print(f"Flag {name}: invalid targeting ({str(e)}), no users will match")
+        return Targeting(key, invalid=True)
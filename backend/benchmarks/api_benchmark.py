@@ -0,0 +1,258 @@
+"""
+Latency and throughput of the runtime and admin endpoints against a seeded database.
+
+Seeds a fresh database (a temporary SQLite file, or --database-url for a throwaway PostgreSQL),
+then drives each scenario at a fixed concurrency, in-process through the ASGI app and/or over HTTP
+against a uvicorn server. Seeded flags are already analyzed and the background analysis workers are
+off, so no analysis writes run alongside the measured requests.
+Results are JSON with the commit and parameters, so runs can be compared; pass --baseline to fail
+when p50/p99 regress beyond --max-regression.
+
+The SQLite default is for quick local runs: it has a single writer, so create_flag runs one request
+at a time there. Use PostgreSQL for numbers that mean anything for production. In http mode the
+client shares the machine with the server; on few cores the client's own CPU use shows up in latency.
+
+Run from backend/:
+    python -m benchmarks.api_benchmark --flags 10000 --users 1000000 --concurrency 16 --output bench.json
+    python -m benchmarks.api_benchmark --flags 10000 --baseline bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import httpx
+
+SCENARIOS = ("check", "all", "get_flags", "get_approvals", "create_flag")
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def request_factory(scenario, args, mode):
+    """
+    Deterministic stream of (method, url, json body) for a scenario
+    """
+    rng = random.Random(f"{scenario}-{args.seed}")
+    counter = iter(range(10**9))
+
+    def next_request():
+        user_id = f"user-{rng.randrange(args.users)}"
+        if scenario == "check":
+            return "GET", f"/api/runtime/check?flag_name=flag-{rng.randrange(args.flags)}&user_id={user_id}", None
+        if scenario == "all":
+            return "GET", f"/api/runtime/all?user_id={user_id}", None
+        if scenario == "get_flags":
+            return "GET", f"/api/flags/?limit={args.page_size}&status={rng.choice(['active', 'pending'])}", None
+        if scenario == "get_approvals":
+            return "GET", f"/api/approvals/?limit={args.page_size}&status={rng.choice(['pending', 'approved'])}", None
+        return "POST", "/api/flags/", {
+            "name": f"bench-{mode}-{args.seed}-{next(counter)}",
+            "description": "Benchmark flag touching the payment retry queue",
+            "created_by": "benchmark",
+            "code_changes": "Retry failed webhook deliveries with backoff",
+            "scope": "backend",
+            "config": {"rollout_percentage": 10}
+        }
+
+    return next_request
+
+async def drive(client, next_request, total, concurrency):
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, body = next_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+async def run_scenarios(client, args, mode):
+    results = {}
+    for scenario in args.scenarios:
+        next_request = request_factory(scenario, args, mode)
+        if scenario == "create_flag":
+            total, concurrency = args.create_requests, args.create_concurrency
+        else:
+            total, concurrency = args.requests, args.concurrency
+            await drive(client, next_request, args.warmup, concurrency)
+
+        latencies, errors, elapsed = await drive(client, next_request, total, concurrency)
+        results[scenario] = {
+            "requests": total,
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "throughput_rps": round(total / elapsed, 1)
+        }
+        print(f"{mode} {scenario}: {results[scenario]}", file=sys.stderr)
+    return results
+
+async def run_in_process(args):
+    from app.db.database import async_engine
+    from app.main import app
+
+    # ASGITransport does not run the lifespan (snapshot load, workers), so enter it here
+    async with app.router.lifespan_context(app):
+        # Unhandled errors become 500s and count as errors, as they would over HTTP
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            results = await run_scenarios(client, args, "in_process")
+    # Close pooled connections while this event loop is still running
+    await async_engine.dispose()
+    return results
+
+async def run_http(args, env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.2)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            return await run_scenarios(client, args, "http")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def compare(results, baseline, max_regression):
+    """
+    Scenario latencies that got worse than the baseline by more than max_regression
+    """
+    regressions = []
+    for mode, scenarios in results.items():
+        for scenario, current in scenarios.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(scenario)
+            if not previous:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if previous[metric] and current[metric] > previous[metric] * (1 + max_regression):
+                    regressions.append(f"{mode} {scenario} {metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark runtime and admin endpoints on a seeded database")
+    parser.add_argument("--flags", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000000, help="Size of the user id space requests draw from")
+    parser.add_argument("--active-share", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per read scenario")
+    parser.add_argument("--create-requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--create-concurrency", type=int,
+                        help="Concurrency of create_flag (default: --concurrency, 1 on SQLite, which has a single writer)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--mode", choices=["in-process", "http", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers in http mode")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--database-url", help="Throwaway database; its tables are dropped and recreated")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    database_url = args.database_url or f"sqlite:///{os.path.join(tmpdir.name, 'benchmark.db')}"
+    if args.create_concurrency is None:
+        args.create_concurrency = 1 if database_url.startswith("sqlite") else args.concurrency
+
+    # Before importing the app: its database engine and analyzer are configured from the environment
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GOOGLE_API_KEY="",  # Keyword fallback analyzer, so create_flag never waits on a model
+        AI_RISK_MODEL=os.environ.get("AI_RISK_MODEL", "fallback"),
+        AI_CACHE_PERSIST="false",
+        EXPOSURE_LOG="off",
+        RISK_ANALYSIS_WORKERS="0"  # Created flags stay pending; analysis writes would compete with measured requests
+    )
+    env.pop("ASYNC_DATABASE_URL", None)
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.update(env)
+
+    from sqlalchemy import text
+    from app.db.database import Base, engine
+    from benchmarks.explain_hot_queries import seed
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        seed(conn, args.flags, args.active_share)
+        conn.execute(text("ANALYZE"))
+    seed_seconds = time.perf_counter() - start
+
+    results = {}
+    # The app prints per-request diagnostics; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.mode in ("in-process", "both"):
+            results["in_process"] = asyncio.run(run_in_process(args))
+        if args.mode in ("http", "both"):
+            results["http"] = asyncio.run(run_http(args, env))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "seed_seconds": round(seed_seconds, 2),
+            **{key: value for key, value in vars(args).items() if key not in ("output", "baseline", "database_url")}
+        },
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            sys.exit("Regressions:\n" + "\n".join(regressions))
+
+    tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark for the rollout bucketing engines.
+
+Run from backend/:
+    python -m benchmarks.bucketing_benchmark --users 100000
+"""
+import argparse
+import hashlib
+import json
+import timeit
+from app.services.bucketing import ENGINES, LEGACY_ENGINE
+
+def original_bucket(flag_name: str, user_id: str) -> int:
+    # The pre-engine implementation from runtime.py, kept as the baseline
+    return int(hashlib.md5(f"{flag_name}:{user_id}".encode()).hexdigest(), 16) % 100
+
+def check_legacy_compatibility(user_ids, flag_name: str):
+    engine = ENGINES[LEGACY_ENGINE]
+    for user_id in user_ids:
+        if engine.bucket(flag_name, user_id) // 100 != original_bucket(flag_name, user_id):
+            raise AssertionError(f"{LEGACY_ENGINE} diverges from the original hash for {user_id}")
+
+def best_of(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rollout bucketing engines")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--flag", default="benchmark-flag")
+    args = parser.parse_args()
+
+    user_ids = [f"user-{i}" for i in range(args.users)]
+    encoded_user_ids = [user_id.encode() for user_id in user_ids]
+
+    check_legacy_compatibility(user_ids, args.flag)
+
+    results = {
+        "original": {
+            "single_ns_per_user": best_of(
+                lambda: [original_bucket(args.flag, u) for u in user_ids], args.repeat
+            ) / args.users * 1e9
+        }
+    }
+
+    for name, engine in ENGINES.items():
+        single = best_of(lambda: [engine.bucket(args.flag, u) for u in user_ids], args.repeat)
+        batched = best_of(lambda: engine.buckets(args.flag, encoded_user_ids), args.repeat)
+
+        # Share of users below a 10% threshold, as a sanity check on distribution
+        buckets = engine.buckets(args.flag, encoded_user_ids)
+        share = sum(1 for b in buckets if b < 1000) / len(buckets)
+
+        results[name] = {
+            "single_ns_per_user": single / args.users * 1e9,
+            "batched_ns_per_user": batched / args.users * 1e9,
+            "share_below_10_percent": round(share, 4),
+        }
+
+    print(json.dumps({"users": args.users, "engines": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
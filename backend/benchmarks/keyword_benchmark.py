@@ -0,0 +1,114 @@
+"""
+Benchmark and equivalence check for the fallback keyword scorer.
+
+Run from backend/:
+    python -m benchmarks.keyword_benchmark --submissions 2000 --diff-kb 256
+"""
+import argparse
+import json
+import random
+import re
+import string
+import timeit
+from app.ai.keyword_matcher import DEFAULT_KEYWORD_TABLES, TIERS, keyword_matcher
+
+def legacy_score(flag_data):
+    # The original _fallback_analysis scoring loop (minus its prints), kept as the reference
+    scope = flag_data.get("scope", "").lower()
+    all_text = " ".join([
+        flag_data.get("name", "").lower(), scope,
+        flag_data.get("code_changes", "").lower(), flag_data.get("description", "").lower()
+    ])
+
+    detected_issues = []
+    risk_score = 10
+    counts = []
+    for tier in TIERS:
+        found = 0
+        for keyword, weight in DEFAULT_KEYWORD_TABLES[tier].items():
+            if keyword in all_text:
+                detected_issues.append(f"{tier}_{keyword.replace(' ', '_')}")
+                risk_score += weight
+                found += 1
+        counts.append(found)
+
+    if scope in ["all", "all systems"]:
+        risk_score += 15
+        detected_issues.append("affects_all_systems")
+    elif scope == "database":
+        risk_score += 20
+        detected_issues.append("database_scope")
+
+    return min(risk_score, 100), detected_issues or ["routine_change"], counts
+
+def random_submission(rng, keywords, words, diff_chars):
+    text, length = [], 0
+    while length < diff_chars:
+        text.append(rng.choice(keywords).upper() if keywords and rng.random() < 0.01 else rng.choice(words))
+        length += len(text[-1]) + 1
+    vocabulary = words + keywords
+    return {
+        "name": "-".join(rng.choice(vocabulary) for _ in range(2)).replace(" ", "-"),
+        "description": " ".join(rng.choice(vocabulary) for _ in range(20)),
+        "scope": rng.choice(["frontend", "backend", "database", "all", "all systems"]),
+        "code_changes": " ".join(text),
+        "config": {}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled keyword matcher with the original scan")
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--diff-kb", type=int, default=256, help="Size of the large code_changes payload")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    keywords = [keyword for tier in TIERS for keyword in DEFAULT_KEYWORD_TABLES[tier]]
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(5000)]
+
+    submissions = [random_submission(rng, keywords, words, rng.randint(0, 400)) for _ in range(args.submissions)]
+    for flag_data in submissions:
+        expected_score, expected_issues, counts = legacy_score(flag_data)
+        result = keyword_matcher.score(flag_data)
+        if (result["risk_score"], result["detected_issues"]) != (expected_score, expected_issues):
+            raise AssertionError(f"Score mismatch for {flag_data['name']}")
+        if result["ai_reasoning"] != (
+            f"Fallback analysis: {counts[0]} critical, {counts[1]} high, "
+            f"{counts[2]} medium, {counts[3]} routine keywords detected."
+        ):
+            raise AssertionError(f"Reasoning mismatch for {flag_data['name']}")
+
+    large_cases = {
+        "with_keywords": random_submission(rng, keywords, words, args.diff_kb * 1024),
+        "without_keywords": random_submission(rng, [], words, args.diff_kb * 1024)
+    }
+    alternation = re.compile("(?=(" + "|".join(
+        re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)
+    ) + "))")
+
+    def best_of(func):
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    results = {
+        "submissions_checked": len(submissions),
+        "small_batch_ms": {
+            "legacy": best_of(lambda: [legacy_score(s) for s in submissions]) * 1000,
+            "matcher": best_of(lambda: keyword_matcher.score_many(submissions)) * 1000
+        },
+        "large_diff_ms": {"diff_kb": args.diff_kb}
+    }
+
+    for case, flag_data in large_cases.items():
+        if keyword_matcher.score(flag_data)["detected_issues"] != legacy_score(flag_data)[1]:
+            raise AssertionError(f"Score mismatch for the large diff {case}")
+        text = flag_data["code_changes"].lower()
+        results["large_diff_ms"][case] = {
+            "legacy": best_of(lambda: legacy_score(flag_data)) * 1000,
+            "matcher": best_of(lambda: keyword_matcher.score(flag_data)) * 1000,
+            "regex_alternation_scan": best_of(lambda: {m.group(1) for m in alternation.finditer(text)}) * 1000
+        }
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Lookup latency of the risk analysis similarity index.
+
+Run from backend/:
+    python -m benchmarks.similarity_benchmark --flags 100000
+"""
+import argparse
+import json
+import random
+import string
+import time
+from app.ai.similarity_index import SimilarityIndex
+
+def random_submission(rng, words, i):
+    return {
+        "name": f"{rng.choice(words)}-{rng.choice(words)}-v{i % 5}",
+        "description": " ".join(rng.choices(words, k=25)),
+        "scope": rng.choice(["frontend", "backend", "database", "all"]),
+        "code_changes": " ".join(rng.choices(words, k=60))
+    }
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure similarity index build, insert and lookup times")
+    parser.add_argument("--flags", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20000)]
+    submissions = [random_submission(rng, words, i) for i in range(args.flags)]
+
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.load(list(enumerate(submissions)))
+    load_seconds = time.perf_counter() - start
+
+    inserts = []
+    for i in range(200):
+        start = time.perf_counter()
+        index.add(f"new-{i}", random_submission(rng, words, i))
+        inserts.append(time.perf_counter() - start)
+
+    # Half near-duplicates of stored flags (renamed variants), half unrelated submissions
+    queries, expected = [], []
+    for _ in range(args.queries // 2):
+        i = rng.randrange(args.flags)
+        queries.append(dict(submissions[i], name=submissions[i]["name"] + "-v2"))
+        expected.append(str(i))
+        queries.append(random_submission(rng, words, 0))
+        expected.append(None)
+
+    latencies, correct = [], 0
+    for query, want in zip(queries, expected):
+        start = time.perf_counter()
+        match = index.query(query)
+        latencies.append(time.perf_counter() - start)
+        correct += (match.flag_id if match else None) == want
+
+    print(json.dumps({
+        "flags": len(index),
+        "load_seconds": load_seconds,
+        "insert_ms": {"p50": percentile(inserts, 0.5) * 1000, "p99": percentile(inserts, 0.99) * 1000},
+        "query_us": {"p50": percentile(latencies, 0.5) * 1e6, "p99": percentile(latencies, 0.99) * 1e6},
+        "accuracy": correct / len(queries)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
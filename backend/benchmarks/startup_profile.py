@@ -0,0 +1,89 @@
+"""
+Check that the API modules import within a time budget.
+
+Imports app.main and app.runtime_main in fresh interpreters with -X importtime, prints the
+slowest imports, and fails if either goes over its budget or pulls in a module it should
+only load on first use (the model SDK, and for the runtime app the admin API and AI stack).
+Nothing touches the database at import time, so a throwaway SQLite URL is enough.
+
+Run from backend/:
+    python -m benchmarks.startup_profile --budget 2.0 --runtime-budget 1.75
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+# Modules each app must not import at startup (prefix match)
+FORBIDDEN = {
+    "app.main": ["google.generativeai", "google.ai"],
+    "app.runtime_main": ["google.generativeai", "google.ai", "app.ai", "app.api.flags",
+                         "app.api.approvals", "app.api.segments"],
+}
+
+def profile_import(module: str, env: Dict[str, str]) -> Tuple[float, Dict[str, Tuple[float, float]]]:
+    """
+    Import module in a new interpreter; returns the total import time in seconds and
+    {module: (self seconds, cumulative seconds)} from -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    total = sum(self_time for self_time, _ in modules.values())
+    return total, modules
+
+def check(module: str, budget: float, runs: int, top: int, env: Dict[str, str]) -> List[str]:
+    totals, modules = [], {}
+    for _ in range(runs):
+        total, modules = profile_import(module, env)
+        totals.append(total)
+    total = statistics.median(totals)
+
+    print(f"{module}: {total:.3f}s median over {runs} runs (budget {budget:.3f}s)")
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_time, cumulative) in [item for item in slowest if "." not in item[0]][:top]:
+        print(f"  {cumulative * 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total > budget:
+        failures.append(f"{module} takes {total:.3f}s to import, over the {budget:.3f}s budget")
+    for prefix in FORBIDDEN[module]:
+        loaded = [name for name in modules if name == prefix or name.startswith(prefix + ".")]
+        if loaded:
+            failures.append(f"{module} imports {prefix} at startup")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Assert the API imports within a time budget")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds allowed for import app.main")
+    parser.add_argument("--runtime-budget", type=float, default=1.75, help="Seconds allowed for import app.runtime_main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Top-level packages to list, slowest first")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'startup.db')}")
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+        failures = check("app.main", args.budget, args.runs, args.top, env)
+        failures += check("app.runtime_main", args.runtime_budget, args.runs, args.top, env)
+
+    if failures:
+        sys.exit("\n".join(failures))
+
+if __name__ == "__main__":
+    main()
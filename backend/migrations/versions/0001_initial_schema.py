@@ -0,0 +1,67 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations existed
+
+Databases created that way can be adopted with `alembic stamp 0001` and then upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+flag_status = sa.Enum("PENDING", "APPROVED", "REJECTED", "ACTIVE", "INACTIVE", name="flagstatus")
+risk_level = sa.Enum("LOW", "MEDIUM", "HIGH", "CRITICAL", name="risklevel")
+approval_status = sa.Enum("PENDING", "APPROVED", "REJECTED", name="approvalstatus")
+
+def upgrade():
+    op.create_table(
+        "feature_flags",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False, unique=True),
+        sa.Column("description", sa.Text()),
+        sa.Column("created_by", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.Column("status", flag_status),
+        sa.Column("risk_level", risk_level, nullable=True),
+        sa.Column("config", sa.JSON()),
+        sa.Column("code_changes", sa.Text()),
+        sa.Column("scope", sa.String(255)),
+    )
+
+    op.create_table(
+        "risk_analyses",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("flag_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("feature_flags.id"), nullable=False),
+        sa.Column("risk_score", sa.Float(), nullable=False),
+        sa.Column("ai_reasoning", sa.Text()),
+        sa.Column("detected_issues", sa.JSON()),
+        sa.Column("recommendation", sa.Text()),
+        sa.Column("analyzed_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "approvals",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("flag_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("feature_flags.id"), nullable=False),
+        sa.Column("approver_id", sa.String(255), nullable=False),
+        sa.Column("status", approval_status),
+        sa.Column("comment", sa.Text()),
+        sa.Column("approved_at", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+def downgrade():
+    op.drop_table("approvals")
+    op.drop_table("risk_analyses")
+    op.drop_table("feature_flags")
+
+    bind = op.get_bind()
+    for enum in (approval_status, risk_level, flag_status):
+        enum.drop(bind, checkfirst=True)
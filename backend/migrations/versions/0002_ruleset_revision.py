@@ -0,0 +1,30 @@
+"""Global ruleset revision counter and per-flag revision
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    ruleset_revision = op.create_table(
+        "ruleset_revision",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("revision", sa.BigInteger(), nullable=False),
+    )
+    op.bulk_insert(ruleset_revision, [{"id": 1, "revision": 0}])
+
+    op.add_column(
+        "feature_flags",
+        sa.Column("revision", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+def downgrade():
+    op.drop_column("feature_flags", "revision")
+    op.drop_table("ruleset_revision")
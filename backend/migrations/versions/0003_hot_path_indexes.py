@@ -0,0 +1,44 @@
+"""Indexes for the hot lookups
+
+- feature_flags: active flags by name (partial), status-filtered listings, keyset pagination
+- approvals: by flag, pending queue per approver, keyset pagination
+- risk_analyses: by flag, in analysis order
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status = 'ACTIVE'")
+
+def upgrade():
+    op.create_index(
+        "ix_feature_flags_active_name", "feature_flags", ["name"],
+        postgresql_where=ACTIVE, sqlite_where=ACTIVE,
+    )
+    op.create_index("ix_feature_flags_status_created", "feature_flags", ["status", "created_at", "id"])
+    op.create_index("ix_feature_flags_created", "feature_flags", ["created_at", "id"])
+
+    op.create_index("ix_approvals_flag_created", "approvals", ["flag_id", "created_at"])
+    op.create_index("ix_approvals_approver_status", "approvals", ["approver_id", "status"])
+    op.create_index("ix_approvals_created", "approvals", ["created_at", "id"])
+
+    op.create_index("ix_risk_analyses_flag_analyzed", "risk_analyses", ["flag_id", "analyzed_at"])
+
+def downgrade():
+    op.drop_index("ix_risk_analyses_flag_analyzed", table_name="risk_analyses")
+
+    op.drop_index("ix_approvals_created", table_name="approvals")
+    op.drop_index("ix_approvals_approver_status", table_name="approvals")
+    op.drop_index("ix_approvals_flag_created", table_name="approvals")
+
+    op.drop_index("ix_feature_flags_created", table_name="feature_flags")
+    op.drop_index("ix_feature_flags_status_created", table_name="feature_flags")
+    op.drop_index("ix_feature_flags_active_name", table_name="feature_flags")
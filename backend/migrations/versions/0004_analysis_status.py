@@ -0,0 +1,28 @@
+"""Risk analysis status on feature flags
+
+Analysis now runs in a background worker; existing flags were analyzed inline, so they start as COMPLETED.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+analysis_status = sa.Enum("PENDING", "COMPLETED", "FAILED", name="analysisstatus")
+
+def upgrade():
+    analysis_status.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        "feature_flags",
+        sa.Column("analysis_status", analysis_status, nullable=False, server_default="COMPLETED"),
+    )
+
+def downgrade():
+    op.drop_column("feature_flags", "analysis_status")
+    analysis_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,29 @@
+"""Persistent risk analysis cache
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "risk_analysis_cache",
+        sa.Column("cache_key", sa.String(64), primary_key=True),
+        sa.Column("model", sa.String(100), nullable=False),
+        sa.Column("prompt_version", sa.String(32), nullable=False),
+        sa.Column("result", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_risk_analysis_cache_expires", "risk_analysis_cache", ["expires_at"])
+
+def downgrade():
+    op.drop_index("ix_risk_analysis_cache_expires", table_name="risk_analysis_cache")
+    op.drop_table("risk_analysis_cache")
@@ -0,0 +1,29 @@
+"""Exposure events
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "exposure_events",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("flag_name", sa.String(255), nullable=False),
+        sa.Column("user_id", sa.String(255), nullable=False),
+        sa.Column("enabled", sa.Boolean(), nullable=False),
+        sa.Column("rollout_percentage", sa.Float()),
+        sa.Column("evaluated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_exposure_events_flag_time", "exposure_events", ["flag_name", "evaluated_at"])
+
+def downgrade():
+    op.drop_index("ix_exposure_events_flag_time", table_name="exposure_events")
+    op.drop_table("exposure_events")
@@ -0,0 +1,22 @@
+"""Risk analysis claim on feature flags
+
+Workers mark a flag as claimed and release the row before calling the model, instead of
+holding a row lock (and a pooled connection) for the whole analysis.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("feature_flags", sa.Column("analysis_claimed_at", sa.DateTime(), nullable=True))
+
+def downgrade():
+    op.drop_column("feature_flags", "analysis_claimed_at")
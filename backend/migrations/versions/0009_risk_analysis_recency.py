@@ -0,0 +1,20 @@
+"""Index risk analyses by time
+
+The similarity index of every app worker loads the analyses made since its last refresh.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_risk_analyses_analyzed", "risk_analyses", ["analyzed_at"])
+
+def downgrade():
+    op.drop_index("ix_risk_analyses_analyzed", table_name="risk_analyses")
@@ -29,7 +29,7 @@ const riskConfig: Record<RiskLevel, { color: string; icon: any; label: string }>
 };
 
 export default function RiskAnalysisCard({ flag }: Props) {
-  const riskLevel = flag.risk_level || 'low';
+  const riskLevel = flag.risk_level || flag.risk_analysis?.risk_level || 'low';
   const config = riskConfig[riskLevel];
   const Icon = config.icon;
   const riskAnalysis = flag.risk_analysis;
@@ -57,6 +57,14 @@ export default function RiskAnalysisCard({ flag }: Props) {
 
       {riskAnalysis && (
         <>
+          {riskAnalysis.reused && (
+            <p className="mb-4 text-xs text-gray-500">
+              Provisional: reused from a{" "}
+              {Math.round((riskAnalysis.similarity || 0) * 100)}% similar flag
+              while this submission is analyzed
+            </p>
+          )}
+
           {/* Risk Score */}
           <div className="mb-4">
             <div className="flex justify-between text-sm mb-1">
@@ -20,6 +20,25 @@ export default function SubmitFlagPage() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
 
+  // Risk analysis runs in the background; long-poll until the approver is assigned
+  const waitForAnalysis = async (flag: FeatureFlag) => {
+    for (let attempt = 0; attempt < 10; attempt++) {
+      try {
+        const analysis = await flagsApi.getAnalysis(flag.id, 25);
+        if (analysis.analysis_status !== "pending") {
+          setLastSubmitted((current) =>
+            current && current.id === flag.id
+              ? { ...current, ...analysis }
+              : current,
+          );
+          return;
+        }
+      } catch {
+        return;
+      }
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
@@ -28,6 +47,9 @@ export default function SubmitFlagPage() {
     try {
       const result = await flagsApi.create(formData);
       setLastSubmitted(result);
+      if (result.analysis_status === "pending") {
+        waitForAnalysis(result);
+      }
 
       // Reset form (keep email)
       setFormData({
@@ -294,7 +316,9 @@ export default function SubmitFlagPage() {
                         </p>
                         <p className="font-mono text-sm text-gray-900 font-medium">
                           {lastSubmitted.required_approver ||
-                            "senior-engineer@company.com"}
+                            (lastSubmitted.analysis_status === "pending"
+                              ? "Analyzing risk..."
+                              : "senior-engineer@company.com")}
                         </p>
                         <p className="text-xs text-gray-500 mt-1">
                           Assigned based on{" "}
@@ -1,5 +1,5 @@
 import axios from "axios";
-import { FeatureFlag, Approval, FlagCreateData } from "../types";
+import { FeatureFlag, FlagAnalysis, Approval, FlagCreateData } from "../types";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
@@ -28,6 +28,13 @@ export const flagsApi = {
     return response.data;
   },
 
+  getAnalysis: async (id: string, wait = 0): Promise<FlagAnalysis> => {
+    const response = await api.get(`/flags/${id}/analysis`, {
+      params: { wait },
+    });
+    return response.data;
+  },
+
   toggle: async (id: string): Promise<FeatureFlag> => {
     const response = await api.patch(`/flags/${id}/toggle`);
     return response.data;
@@ -6,6 +6,35 @@ export type FlagStatus =
   | "inactive";
 export type RiskLevel = "low" | "medium" | "high" | "critical";
 export type ApprovalStatus = "pending" | "approved" | "rejected";
+export type AnalysisStatus = "pending" | "completed" | "failed";
+
+export type TargetingOperator =
+  | "eq"
+  | "neq"
+  | "in"
+  | "not_in"
+  | "contains"
+  | "starts_with"
+  | "ends_with"
+  | "gt"
+  | "gte"
+  | "lt"
+  | "lte";
+
+export interface TargetingRule {
+  attribute: string;
+  operator: TargetingOperator;
+  value: string | number | Array<string | number>;
+}
+
+export interface FlagConfig {
+  rollout_percentage?: number;
+  target_users?: string[];
+  excluded_users?: string[];
+  target_segments?: string[];
+  excluded_segments?: string[];
+  rules?: TargetingRule[];
+}
 
 export interface RiskAnalysis {
   id: string;
@@ -15,6 +44,11 @@ export interface RiskAnalysis {
   detected_issues: string[];
   recommendation: string;
   analyzed_at: string;
+  // Set on a provisional analysis reused from a similar flag
+  reused?: boolean;
+  reused_from_flag_id?: string;
+  similarity?: number;
+  risk_level?: RiskLevel | null;
 }
 
 export interface FeatureFlag {
@@ -26,14 +60,20 @@ export interface FeatureFlag {
   updated_at: string;
   status: FlagStatus;
   risk_level: RiskLevel | null;
-  config: {
-    rollout_percentage?: number;
-    target_users?: string[];
-  };
+  config: FlagConfig;
   code_changes: string;
   scope: string;
   risk_analysis?: RiskAnalysis | null;
   required_approver?: string | null;
+  analysis_status?: AnalysisStatus;
+}
+
+export interface FlagAnalysis {
+  flag_id: string;
+  analysis_status: AnalysisStatus;
+  risk_level: RiskLevel | null;
+  risk_analysis: RiskAnalysis | null;
+  required_approver: string | null;
 }
 
 export interface Approval {
@@ -53,8 +93,5 @@ export interface FlagCreateData {
   created_by: string;
   code_changes: string;
   scope: string;
-  config: {
-    rollout_percentage?: number;
-    target_users?: string[];
-  };
+  config: FlagConfig;
 }
@@ -0,0 +1,3 @@
+from featureflag_client.client import FeatureFlagClient
+
+__all__ = ["FeatureFlagClient"]
@@ -0,0 +1,47 @@
+"""
+Rollout bucketing, identical to backend/app/services/bucketing.py.
+Any change here must be mirrored there (and vice versa), or SDK and server will disagree.
+"""
+import hashlib
+from typing import Callable, Dict
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+BUCKET_SCALE = 10000
+LEGACY_ENGINE = "md5-legacy"
+
+def _md5_legacy(data: bytes) -> int:
+    value = int.from_bytes(hashlib.md5(data).digest(), "big") % BUCKET_SCALE
+    return (value % 100) * 100 + value // 100
+
+def _blake2b_64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") % BUCKET_SCALE
+
+def _xxh64(data: bytes) -> int:
+    return xxhash.xxh64_intdigest(data) % BUCKET_SCALE
+
+ENGINES: Dict[str, Callable[[bytes], int]] = {
+    LEGACY_ENGINE: _md5_legacy,
+    "blake2b-64": _blake2b_64,
+}
+
+if xxhash is not None:
+    ENGINES["xxh64"] = _xxh64
+
+def bucket(engine: str, salt: str, user_id: str) -> int:
+    try:
+        hash_bucket = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown bucketing engine: {engine}")
+    return hash_bucket(f"{salt}:{user_id}".encode())
+
+def rollout_threshold(rollout_percentage: float) -> int:
+    return round(rollout_percentage * (BUCKET_SCALE // 100))
+
+def format_bucket(bucket: int, rollout_percentage: float) -> str:
+    if float(rollout_percentage).is_integer():
+        return str(bucket // 100)
+    return f"{bucket / 100:.2f}"
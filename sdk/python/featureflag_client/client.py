@@ -0,0 +1,280 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+from featureflag_client.bucketing import ENGINES, bucket, format_bucket, rollout_threshold
+from featureflag_client.targeting import NEEDS_SERVER, Targeting, compile_ruleset_targeting
+
+@dataclass(frozen=True)
+class Ruleset:
+    revision: int
+    flags: Mapping[str, Dict[str, Any]]
+    etag: Optional[str] = None
+    fetched_at: float = 0.0
+    targeting: Mapping[str, Targeting] = field(default_factory=lambda: MappingProxyType({}))
+
+EMPTY_RULESET = Ruleset(revision=0, flags=MappingProxyType({}))
+
+RemoteKey = Tuple[str, Optional[str], Optional[str]]  # (flag, user_id, context as JSON)
+
+class FeatureFlagClient:
+    """
+    Evaluates feature flags in-process from a locally cached ruleset.
+
+    The ruleset is downloaded from /api/runtime/ruleset and refreshed in a background
+    thread with conditional GETs. If the server is unreachable, evaluation keeps using
+    the last ruleset that was fetched successfully.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        refresh_interval: float = 30.0,
+        timeout: float = 2.0,
+        start: bool = True,
+        remote_cache_size: int = 10000,
+        remote_retry_interval: float = 5.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.remote_cache_size = remote_cache_size
+        self.remote_retry_interval = remote_retry_interval
+        self.last_error: Optional[Exception] = None
+
+        self._ruleset = EMPTY_RULESET
+        # Server answers for evaluations that cannot be decided locally, with the ruleset revision they were asked at (LRU)
+        self._remote: "OrderedDict[RemoteKey, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._remote_lock = threading.Lock()
+        self._remote_down_until = 0.0  # After a failed check, skip the server until then rather than wait on it per call
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if start:
+            self.start()
+
+    # Lifecycle
+
+    def start(self):
+        """
+        Fetch the ruleset once, then keep refreshing it in a daemon thread
+        """
+        if self._thread:
+            return
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="featureflag-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Download the ruleset if it changed. Returns False (and keeps the current ruleset) on failure.
+        """
+        current = self._ruleset
+        request = urllib.request.Request(f"{self.base_url}/api/runtime/ruleset")
+        if current.etag:
+            request.add_header("If-None-Match", current.etag)
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+                etag = response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                self.last_error = None
+                return True
+            self.last_error = e
+            return False
+        except Exception as e:
+            self.last_error = e
+            return False
+
+        self._ruleset = Ruleset(
+            revision=payload.get("revision", 0),
+            flags=MappingProxyType(payload.get("flags", {})),
+            etag=etag,
+            fetched_at=time.time(),
+            targeting=MappingProxyType(compile_ruleset_targeting(payload))
+        )
+        self.last_error = None
+        return True
+
+    @property
+    def revision(self) -> int:
+        return self._ruleset.revision
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once a ruleset has been fetched at least once
+        """
+        return self._ruleset is not EMPTY_RULESET
+
+    # Evaluation, mirroring /api/runtime/check
+
+    def evaluate(
+        self,
+        flag_name: str,
+        user_id: Optional[str] = None,
+        context: Optional[Mapping[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        context holds user attributes for the flag's targeting rules
+        """
+        ruleset = self._ruleset
+        flag = ruleset.flags.get(flag_name)
+
+        if not flag:
+            return {
+                "flag_name": flag_name,
+                "enabled": False,
+                "rollout_percentage": 0,
+                "reason": "Flag not found"
+            }
+
+        if flag["status"] != "active":
+            return {
+                "flag_name": flag_name,
+                "enabled": False,
+                "rollout_percentage": flag["rollout_percentage"] or 0,
+                "reason": f"Flag is {flag['status']}, not active"
+            }
+
+        rollout_percentage = 100 if flag["rollout_percentage"] is None else flag["rollout_percentage"]
+
+        targeting = ruleset.targeting.get(flag_name)
+        if targeting:
+            decision = targeting.evaluate(user_id, context)
+            if decision == NEEDS_SERVER:
+                return self._check_remote(ruleset.revision, flag_name, user_id, context, rollout_percentage)
+            if decision:
+                enabled, reason = decision
+                return {
+                    "flag_name": flag_name,
+                    "enabled": enabled,
+                    "rollout_percentage": rollout_percentage,
+                    "reason": reason
+                }
+
+        if rollout_percentage == 100:
+            return {
+                "flag_name": flag_name,
+                "enabled": True,
+                "rollout_percentage": 100,
+                "reason": "Full rollout (100%)"
+            }
+
+        if user_id:
+            if flag["bucketing_engine"] not in ENGINES:
+                # e.g. xxh64 without the xxhash extra installed; the server can always bucket
+                return self._check_remote(
+                    ruleset.revision, flag_name, user_id, context, rollout_percentage,
+                    f"Bucketing engine {flag['bucketing_engine']} is not installed and the server is unreachable"
+                )
+            user_bucket = bucket(flag["bucketing_engine"], flag["bucketing_salt"], user_id)
+            enabled = user_bucket < rollout_threshold(rollout_percentage)
+
+            return {
+                "flag_name": flag_name,
+                "enabled": enabled,
+                "rollout_percentage": rollout_percentage,
+                "reason": f"User hash: {format_bucket(user_bucket, rollout_percentage)}, rollout: {rollout_percentage}%, enabled: {enabled}"
+            }
+
+        return {
+            "flag_name": flag_name,
+            "enabled": False,
+            "rollout_percentage": rollout_percentage,
+            "reason": "No user_id provided for rollout calculation"
+        }
+
+    def _check_remote(
+        self,
+        revision: int,
+        flag_name: str,
+        user_id: Optional[str],
+        context: Optional[Mapping[str, Any]],
+        rollout_percentage: float,
+        unreachable_reason: str = "Targeting list needs the server, which is unreachable"
+    ) -> Dict[str, Any]:
+        """
+        Ask the server about a user this client cannot decide locally (a bloom-filtered list hit,
+        or a bucketing engine that is not installed). Answers are cached until the ruleset changes.
+        If the server cannot be reached, the last answer for the user stands; disabled if there is none.
+        """
+        context_json = json.dumps(context, sort_keys=True, default=str) if context else None
+        key = (flag_name, user_id, context_json)
+        with self._remote_lock:
+            cached = self._remote.get(key)
+            if cached:
+                self._remote.move_to_end(key)
+        if cached and cached[0] == revision:
+            return dict(cached[1])
+
+        if time.monotonic() >= self._remote_down_until:
+            params = {"flag_name": flag_name, "user_id": user_id}
+            if context_json:
+                params["context"] = context_json
+            url = f"{self.base_url}/api/runtime/check?{urllib.parse.urlencode(params)}"
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    result = json.loads(response.read())
+            except Exception as e:
+                self.last_error = e
+                self._remote_down_until = time.monotonic() + self.remote_retry_interval
+            else:
+                with self._remote_lock:
+                    self._remote[key] = (revision, result)
+                    self._remote.move_to_end(key)
+                    while len(self._remote) > self.remote_cache_size:
+                        self._remote.popitem(last=False)
+                return dict(result)
+
+        if cached:
+            # Answered for an older ruleset; better than guessing
+            return dict(cached[1])
+        return {
+            "flag_name": flag_name,
+            "enabled": False,
+            "rollout_percentage": rollout_percentage,
+            "reason": unreachable_reason
+        }
+
+    def is_enabled(
+        self,
+        flag_name: str,
+        user_id: Optional[str] = None,
+        context: Optional[Mapping[str, Any]] = None
+    ) -> bool:
+        return self.evaluate(flag_name, user_id, context)["enabled"]
+
+    def all_flags(self, user_id: Optional[str] = None, context: Optional[Mapping[str, Any]] = None) -> Dict[str, bool]:
+        """
+        Same result as /api/runtime/all
+        """
+        return {
+            name: self.is_enabled(name, user_id, context)
+            for name, flag in self._ruleset.flags.items()
+            if flag["status"] == "active"
+        }
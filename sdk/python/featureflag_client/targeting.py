@@ -0,0 +1,160 @@
+"""
+Targeting evaluation, identical to backend/app/services/targeting.py.
+Any change here must be mirrored there (and vice versa), or SDK and server will disagree.
+
+Long user lists arrive as bloom filters: a miss is definite, a hit may be a false positive,
+so evaluation returns NEEDS_SERVER and the client asks /api/runtime/check.
+"""
+import base64
+import hashlib
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Optional, Tuple, Union
+
+NEEDS_SERVER = "needs_server"
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _compare(test: Callable[[float, float], bool]) -> Callable[[Any, Any], bool]:
+    def compare(actual, expected) -> bool:
+        actual = _number(actual)
+        return actual is not None and test(actual, expected)
+    return compare
+
+OPERATORS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any, Any], bool]]] = {
+    "eq": (str, lambda actual, expected: str(actual) == expected),
+    "neq": (str, lambda actual, expected: str(actual) != expected),
+    "in": (lambda value: frozenset(str(v) for v in value), lambda actual, expected: str(actual) in expected),
+    "not_in": (lambda value: frozenset(str(v) for v in value), lambda actual, expected: str(actual) not in expected),
+    "contains": (str, lambda actual, expected: expected in str(actual)),
+    "starts_with": (str, lambda actual, expected: str(actual).startswith(expected)),
+    "ends_with": (str, lambda actual, expected: str(actual).endswith(expected)),
+    "gt": (float, _compare(lambda actual, expected: actual > expected)),
+    "gte": (float, _compare(lambda actual, expected: actual >= expected)),
+    "lt": (float, _compare(lambda actual, expected: actual < expected)),
+    "lte": (float, _compare(lambda actual, expected: actual <= expected)),
+}
+
+class Predicate:
+    __slots__ = ("attribute", "_compiled", "_test")
+
+    def __init__(self, rule: Mapping[str, Any]):
+        compile_value, self._test = OPERATORS[rule["operator"]]
+        self.attribute = rule["attribute"]
+        self._compiled = compile_value(rule.get("value"))
+
+    def matches(self, context: Mapping[str, Any]) -> bool:
+        actual = context.get(self.attribute)
+        return actual is not None and self._test(actual, self._compiled)
+
+class BloomFilter:
+    __slots__ = ("size_bits", "hashes", "bits")
+
+    def __init__(self, size_bits: int, hashes: int, bits: bytes):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bits
+
+    def __contains__(self, user_id: str) -> bool:
+        digest = hashlib.blake2b(user_id.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big")
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & 0xFFFFFFFFFFFFFFFF) % self.size_bits
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+UserList = Union[FrozenSet[str], BloomFilter]
+
+def decode_users(encoded: Optional[Mapping[str, Any]]) -> UserList:
+    if not encoded:
+        return frozenset()
+    if "bloom" in encoded:
+        bloom = encoded["bloom"]
+        return BloomFilter(bloom["size_bits"], bloom["hashes"], base64.b64decode(bloom["bits"]))
+    return frozenset(encoded.get("users", ()))
+
+def member(users: UserList, user_id: Optional[str]) -> Union[bool, str]:
+    """
+    True, False, or NEEDS_SERVER for a bloom filter hit
+    """
+    if user_id is None or user_id not in users:
+        return False
+    return NEEDS_SERVER if isinstance(users, BloomFilter) else True
+
+class Segment:
+    __slots__ = ("name", "users", "rules")
+
+    def __init__(self, name: str, ruleset_dict: Optional[Mapping[str, Any]]):
+        ruleset_dict = ruleset_dict or {}
+        self.name = name
+        self.users = decode_users(ruleset_dict.get("members"))
+        self.rules = tuple(Predicate(rule) for rule in ruleset_dict.get("rules", ()))
+
+    def contains(self, user_id: Optional[str], context: Mapping[str, Any]) -> Union[bool, str]:
+        found = member(self.users, user_id)
+        if found is True:
+            return True
+        if self.rules and all(predicate.matches(context) for predicate in self.rules):
+            return True
+        return found
+
+class Targeting:
+    __slots__ = ("target_users", "excluded_users", "target_segments", "excluded_segments", "rules", "invalid")
+
+    def __init__(self, ruleset_dict: Mapping[str, Any], segments: Mapping[str, Segment]):
+        self.invalid = bool(ruleset_dict.get("invalid"))
+        self.target_users = decode_users(ruleset_dict.get("target_users"))
+        self.excluded_users = decode_users(ruleset_dict.get("excluded_users"))
+        self.target_segments = tuple(
+            segments.get(name) or Segment(name, None) for name in ruleset_dict.get("target_segments", ())
+        )
+        self.excluded_segments = tuple(
+            segments.get(name) or Segment(name, None) for name in ruleset_dict.get("excluded_segments", ())
+        )
+        self.rules = tuple(Predicate(rule) for rule in ruleset_dict.get("rules", ()))
+
+    def evaluate(self, user_id: Optional[str], context: Optional[Mapping[str, Any]] = None):
+        """
+        (enabled, reason) when targeting decides, None when the percentage rollout should,
+        or NEEDS_SERVER when a bloom filter hit has to be confirmed
+        """
+        if self.invalid:
+            return False, "Invalid targeting config"
+
+        context = context or {}
+
+        found = member(self.excluded_users, user_id)
+        if found:
+            return NEEDS_SERVER if found == NEEDS_SERVER else (False, "User is excluded")
+        for segment in self.excluded_segments:
+            found = segment.contains(user_id, context)
+            if found:
+                return NEEDS_SERVER if found == NEEDS_SERVER else (False, f"User is in excluded segment {segment.name}")
+
+        found = member(self.target_users, user_id)
+        if found:
+            return NEEDS_SERVER if found == NEEDS_SERVER else (True, "User is targeted")
+        for segment in self.target_segments:
+            found = segment.contains(user_id, context)
+            if found:
+                return NEEDS_SERVER if found == NEEDS_SERVER else (True, f"User is in segment {segment.name}")
+
+        if self.rules and not all(predicate.matches(context) for predicate in self.rules):
+            return False, "Targeting rules not matched"
+
+        return None
+
+def compile_ruleset_targeting(payload: Mapping[str, Any]) -> Dict[str, Targeting]:
+    """
+    Compiled targeting for every flag in a /api/runtime/ruleset payload that has any
+    """
+    segments = {name: Segment(name, segment) for name, segment in payload.get("segments", {}).items()}
+    return {
+        name: Targeting(flag["targeting"], segments)
+        for name, flag in payload.get("flags", {}).items()
+        if flag.get("targeting")
+    }